@@ -1,11 +1,20 @@
+from app import startup  # 最先匯入，作為冷啟動計時起點
 import streamlit as st
-import json
 import os
+import time
 import pandas as pd
-from app.translator import translate_text
-from app.analyzer import analyze_jlpt_level
+from app.catalog import SORT_NEWEST, SORT_TARGET, ArticleMatrix
+from app.translator import translate_many, translate_text
+from app.analyzer import (
+    CHUNK_MAX_BYTES, LEVEL_ORDER, TOKENIZER_STAMP, VocabIndex, analysis_levels, refresh_analysis, tokenize_lemmas,
+)
+from app.para_cache import ParagraphAnalysisCache, split_paragraphs
+from app.vocab import load_vocab_index
 import plotly.express as px
 from backend.crawl import fetch_article_full_text
+from backend.store import open_store
+
+startup.mark("imports_done")
 
 # 1. 頁面設定
 st.set_page_config(page_title="NHK News JLPT Analyzer", layout="wide")
@@ -35,105 +44,172 @@ st.markdown("""
 st.title("🇯🇵 NHK News JLPT 學習分析器")
 
 # 2. 載入資料
-@st.cache_data
-def load_data():
-    # 優先讀取正式資料庫 (news_db.json)，如果不存在才讀取測試資料庫
-    # 這樣在 Streamlit Cloud (會有 news_db.json) 也能正確讀取
-    if os.path.exists("data/news_db.json"):
-        file_path = "data/news_db.json"
-    else:
-        file_path = "data/news_db_test.json"
+@st.cache_resource
+def get_store():
+    # 優先讀取正式資料庫 (news.db)，如果不存在才讀取測試資料庫
+    # 舊版 JSON 資料庫會在第一次開啟時自動匯入
+    if os.path.exists("data/news.db") or os.path.exists("data/news_db.json"):
+        return open_store("data/news.db", legacy_json="data/news_db.json")
+    return open_store("data/news_test.db", legacy_json="data/news_db_test.json")
 
-    if not os.path.exists(file_path):
-        return pd.DataFrame()
+@st.cache_resource(ttl=300)
+def load_catalog():
+    """只載入文章摘要並建立 文章 × 級別 計數矩陣 (所有 session 共用)，內文於選取時才讀取"""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            # 將 JSON (Dict) 轉為 DataFrame 以便操作，並處理空資料情況
-            return pd.DataFrame.from_dict(data, orient='index') if data else pd.DataFrame()
+        return ArticleMatrix.from_rows(get_store().list_articles())
     except Exception as e:
         print(f"❌ 讀取資料庫失敗: {e}")
-        return pd.DataFrame()
+        return ArticleMatrix.from_rows([])
 
-@st.cache_data
-def load_vocab():
-    raw_url = "https://raw.githubusercontent.com/Bluskyo/JLPT_Vocabulary/main/data/results/JLPTWords.csv"
-    
+@st.cache_data(ttl=300)
+def load_article(aid):
+    return get_store().get(aid)
+
+@st.cache_data(ttl=300)
+def search_articles(query):
+    """以倒排索引查詢包含某單字的文章；先當作 lemma 直接查詢，查無結果才斷詞後以片語查詢"""
+    store = get_store()
+    hits = store.search_lemmas([query])
+    if not hits:
+        lemmas = tokenize_lemmas(query)
+        if lemmas != [query]:
+            hits = store.search_lemmas(lemmas)
+    return hits
+
+@st.cache_data(ttl=300)
+def filter_by_level(level, min_count):
+    return get_store().articles_with_min_level(level, min_count)
+
+@st.cache_data(ttl=300)
+def load_daily_stats(days):
+    """讀取同步時累計的每日統計 (只掃過 days 筆)，不需重新分析任何文章"""
+    rows = get_store().daily_stats(days)
+    return pd.DataFrame(rows).set_index('day') if rows else pd.DataFrame()
+
+@st.cache_data(ttl=300)
+def load_top_words(level, days, vocab_version, _vocab, limit=20):
+    """最近 days 天某級別出現最多次的單字 (vocab_version 作為快取鍵，_vocab 不參與雜湊)"""
+    store = get_store()
+    store.set_vocab(_vocab)
+    rows = store.top_lemmas(days, limit, level=level)
+    return pd.DataFrame(rows, columns=['word', 'count'])
+
+@st.cache_resource
+def load_vocab(refresh=False):
+    """優先讀取本機字彙快照 (data/jlpt_vocab.bin)，不存在或要求更新時才從線上下載"""
     try:
-        with st.spinner('📡 正在從線上同步 JLPT 全級別字彙庫...'):
-            # 直接讀取線上 CSV
-            df = pd.read_csv(raw_url)
-            
-            # 1. 強制清理欄位名稱：去除首尾空白並轉為小寫
-            # 這樣無論 CSV 是 "Word" 還是 "word" 都能對齊
-            df.columns = df.columns.str.strip().str.lower()
-            
-            # 2. 定義對應關係（將我們代碼用的 'word' 對應到 CSV 的 'word'）
-            # 根據你提供的結構，我們需要的是 'word' 和 'jlptlevel'
-            if 'word' in df.columns and 'jlptlevel' in df.columns:
-                # 重新命名以便後續代碼統一使用
-                df = df.rename(columns={'jlptlevel': 'level'})
-            else:
-                # 萬一標題完全對不上，回傳錯誤訊息
-                st.error(f"❌ CSV 結構不符。現有欄位: {list(df.columns)}")
-                return pd.DataFrame(columns=['word', 'level'])
-            
-            # 3. 數據清洗
-            df['word'] = df['word'].astype(str).str.strip()
-            df['level'] = df['level'].astype(str).str.strip()
-            
-            # 4. 格式標準化：確保 Level 顯示為 N1, N2...
-            # 有些資料會存成 "1" 或 "n1"，我們統一轉換
-            def format_level(lv):
-                lv = lv.upper()
-                return lv if lv.startswith('N') else f"N{lv}"
-            
-            df['level'] = df['level'].apply(format_level)
-            
-            # 5. 移除重複項，確保每個單字只有一個難度分級
-            df = df.drop_duplicates(subset=['word'], keep='first')
-            
-            return df[['word', 'level']]
-            
+        with st.spinner('📡 正在載入 JLPT 全級別字彙庫...'):
+            return load_vocab_index(refresh=refresh)
+    except ValueError as e:
+        # 萬一 CSV 標題完全對不上，回傳錯誤訊息
+        st.error(f"❌ {e}")
+        return VocabIndex({})
     except Exception as e:
         st.error(f"❌ 線上詞庫載入失敗: {e}")
-        return pd.DataFrame(columns=['word', 'level'])
+        return VocabIndex({})
+
+@st.cache_resource
+def get_paragraph_cache():
+    """段落分析快取，所有 session 共用；rerun (例如按下翻譯) 時不會重新斷詞未變動的段落"""
+    return ParagraphAnalysisCache()
+
+def paragraph_level_stats(paragraphs, vocab):
+    return get_paragraph_cache().analyze(paragraphs, vocab)[0]
 
-def plot_jlpt_distribution(text, vocab_df):
-    """繪製 JLPT 難度分佈圓餅圖的共用函式"""
-    level_stats = analyze_jlpt_level(text, vocab_df)
+def article_level_stats(article, paragraphs, vocab):
+    """優先使用同步階段儲存的分析結果，只有版本戳記過期時才重新計算"""
+    analysis = article.get('analysis')
+    if isinstance(analysis, dict) and len(vocab) == 0:
+        # 詞庫載入失敗時，沿用同步當時的統計結果
+        return analysis_levels(analysis)
+    if not isinstance(analysis, dict) or analysis.get('tokenizer') != TOKENIZER_STAMP:
+        # 沒有可用的斷詞結果：以段落快取分析，避免每次 rerun 重新斷詞整篇文章
+        return paragraph_level_stats(paragraphs, vocab)
+    return analysis_levels(refresh_analysis(analysis, "".join(paragraphs), vocab))
+
+def plot_jlpt_distribution(level_stats, container=st, key=None):
+    """繪製 JLPT 難度分佈圓餅圖的共用函式 (container 可為 st.empty() 以便逐步更新)"""
     fig = px.pie(values=level_stats.values, names=level_stats.index, 
                  title="全文單字難度分佈",
                  color_discrete_sequence=px.colors.sequential.RdBu)
-    st.plotly_chart(fig, width='stretch')
+    container.plotly_chart(fig, width='stretch', key=key)
     return level_stats
 
-df_news = load_data()
-df_vocab = load_vocab()
+def plot_progressive_distribution(paragraphs, vocab, interval=0.5):
+    """長文逐段 (單一長段落則逐塊) 分析時每 interval 秒更新一次圓餅圖與進度條，分析完成後畫出最終結果"""
+    chart = st.empty()
+    is_long = len(paragraphs) > 1 or any(len(p.encode('utf-8')) > CHUNK_MAX_BYTES for p in paragraphs)
+    progress = st.progress(0.0) if is_long else None
+    level_stats = pd.Series([0] * len(LEVEL_ORDER), index=LEVEL_ORDER)
+    last_draw = time.monotonic()
+    for level_stats, _, done in get_paragraph_cache().iter_analyze(paragraphs, vocab):
+        if progress:
+            progress.progress(done / len(paragraphs), text=f"分析中... {int(done)}/{len(paragraphs)} 段")
+        if done < len(paragraphs) and time.monotonic() - last_draw > interval:
+            plot_jlpt_distribution(level_stats, chart, key=f"partial_{done}")
+            last_draw = time.monotonic()
+    if progress:
+        progress.empty()
+    return plot_jlpt_distribution(level_stats, chart)
+
+catalog = load_catalog()
+vocab_index = load_vocab()
+if st.sidebar.button("🔄 重新下載字彙表"):
+    load_vocab.clear()
+    vocab_index = load_vocab(refresh=True)
 
 # 3. 側邊欄：功能選單
 st.sidebar.header("功能選單")
 
 MODE_NEWS = "📰 NHK 新聞閱讀"
 MODE_CUSTOM = "📝 自訂文章分析"
-app_mode = st.sidebar.radio("請選擇模式", [MODE_NEWS, MODE_CUSTOM])
+MODE_STATS = "📈 語料難度趨勢"
+app_mode = st.sidebar.radio("請選擇模式", [MODE_NEWS, MODE_CUSTOM, MODE_STATS])
 
 if app_mode == MODE_NEWS:
-    if df_news.empty:
+    if len(catalog) == 0:
         st.warning("目前沒有新聞資料，請先執行 `python sync_news.py` 進行同步。")
         st.stop()
 
-    # 根據 timestamp 排序 (最新的在最上面)
-    if 'timestamp' in df_news.columns:
-        df_news = df_news.sort_values('timestamp', ascending=False)
+    # 🔍 倒排索引查詢：單字搜尋與級別門檻 (不重新斷詞任何文章)
+    query = st.sidebar.text_input("🔍 搜尋單字", placeholder="例如：経済").strip()
+    level_filter = st.sidebar.selectbox("級別門檻", ["不限"] + LEVEL_ORDER)
+    min_count = st.sidebar.number_input("至少幾個該級別單字", min_value=1, value=20, disabled=level_filter == "不限")
+    allowed_ids = None
+    if query:
+        hits = search_articles(query)
+        st.sidebar.caption(f"找到 {len(hits)} 篇包含「{query}」的新聞")
+        allowed_ids = {h['id'] for h in hits}
+    if level_filter != "不限":
+        level_ids = {h['id'] for h in filter_by_level(level_filter, int(min_count))}
+        allowed_ids = level_ids if allowed_ids is None else allowed_ids & level_ids
+
+    # 📚 以計數矩陣向量化排序與篩選：最新 / 最接近目標級別，並可限制 N3 以上占比
+    sort = st.sidebar.radio("排序方式", [SORT_NEWEST, SORT_TARGET],
+                            format_func={SORT_NEWEST: "最新", SORT_TARGET: "最接近目標級別"}.get, horizontal=True)
+    target = st.sidebar.select_slider("目標級別", options=LEVEL_ORDER, value='N3') if sort == SORT_TARGET else None
+    ratio_low, ratio_high = st.sidebar.slider("N3 以上難度占比 (%)", 0, 100, (0, 100))
+    ratio_range = None if (ratio_low, ratio_high) == (0, 100) else (ratio_low / 100, ratio_high / 100)
+    order = catalog.order(sort, target, catalog.mask(allowed_ids, ratio_range))
+    if len(order) == 0:
+        st.info("沒有符合條件的新聞。")
+        st.stop()
 
-    # ✅ 優化：改用 index (文章 ID) 作為 selectbox 的值，並用 format_func 顯示標題
-    selected_aid = st.sidebar.selectbox(
-        "請選擇一篇新聞", 
-        options=df_news.index.tolist(),
-        format_func=lambda x: df_news.loc[x, 'title']
+    # 分頁：每頁只把該頁的標題交給 selectbox
+    page_size = 20
+    page_count = (len(order) - 1) // page_size + 1
+    page = st.sidebar.number_input(f"頁數 (共 {page_count} 頁，{len(order)} 則)", min_value=1, max_value=page_count, value=1)
+    rows = catalog.page(order, page - 1, page_size)
+    selected_row = st.sidebar.selectbox(
+        "請選擇一篇新聞",
+        options=rows.tolist(),
+        format_func=lambda i: catalog.titles[i]
     )
-    current_article = df_news.loc[selected_aid]
+    selected_aid = catalog.ids[selected_row]
+    current_article = load_article(selected_aid)
+    if current_article is None:
+        st.warning("這則新聞已從資料庫中移除，請重新選擇。")
+        st.stop()
 
     # --- 核心邏輯：即時獲取內文 ---
     # 優先使用資料庫中的內容，如果沒有才即時抓取 (理論上 sync_news 跑過後都會有)
@@ -146,8 +222,6 @@ if app_mode == MODE_NEWS:
         except Exception as e:
             st.error(f"⚠️ 無法讀取內文，請稍後再試。(錯誤: {e})")
             paragraphs = []
-            
-    full_text = "".join(paragraphs) # 用於 JLPT 分析
 
     # 4. 主畫面佈局
     col1, col2 = st.columns([1, 1])
@@ -162,6 +236,12 @@ if app_mode == MODE_NEWS:
         if selected_aid not in st.session_state.translations:
             st.session_state.translations[selected_aid] = {}
 
+        # 一次翻譯所有尚未翻譯的段落 (已快取的段落不會重複送出請求)
+        if paragraphs and st.button("翻譯全部段落", key=f"btn_{selected_aid}_all"):
+            with st.spinner("翻譯中..."):
+                for i, translated in enumerate(translate_many(paragraphs)):
+                    st.session_state.translations[selected_aid][i] = translated
+
         for i, para in enumerate(paragraphs):
             st.write(para)
             # 每段提供翻譯按鈕
@@ -176,8 +256,8 @@ if app_mode == MODE_NEWS:
 
     with col2:
         st.subheader("📊 JLPT 全文難度分析")
-        # 使用完整的內文進行分析
-        level_stats = plot_jlpt_distribution(full_text, df_vocab)
+        # 使用同步時儲存的全文分析結果 (過期或缺少時才以段落快取重新分析)
+        level_stats = plot_jlpt_distribution(article_level_stats(current_article, paragraphs, vocab_index))
         
         # 顯示指標
         total_words = level_stats.sum()
@@ -215,11 +295,56 @@ elif app_mode == MODE_CUSTOM:
             
         with col2:
             st.subheader("📊 JLPT 難度分析")
-            level_stats = plot_jlpt_distribution(target_text, df_vocab)
+            # 依段落快取分析：按下翻譯或只修改部分段落時，只有變動的段落需要重新斷詞；長文逐步顯示結果
+            level_stats = plot_progressive_distribution(split_paragraphs(target_text), vocab_index)
             
             total_words = level_stats.sum()
             n3_up_ratio = (level_stats[['N1', 'N2', 'N3']].sum() / total_words * 100) if total_words > 0 else 0
             st.metric("N3 以上難度占比", f"{n3_up_ratio:.1f}%")
 
+elif app_mode == MODE_STATS:
+    st.subheader("📈 語料難度趨勢")
+    days = st.sidebar.slider("統計天數", min_value=7, max_value=90, value=30)
+    daily = load_daily_stats(days)
+    if daily.empty:
+        st.warning("目前沒有統計資料，請先執行 `python sync_news.py` 進行同步。")
+        st.stop()
+
+    level_cols = [lv.lower() for lv in LEVEL_ORDER]
+    level_mix = daily[level_cols].rename(columns=dict(zip(level_cols, LEVEL_ORDER)))
+    level_total = level_mix.sum()
+    total_words = level_total.sum()
+    total_lemmas = daily['lemmas'].sum()
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("新聞數", int(daily['articles'].sum()))
+    col2.metric("N3 以上難度占比", f"{(level_total[['N1', 'N2', 'N3']].sum() / total_words * 100) if total_words > 0 else 0:.1f}%")
+    # 字彙表外比例：未被任何 JLPT 字彙比對到的 lemma 占比 (含助詞、標點與專有名詞)
+    col3.metric("字彙表外比例", f"{(1 - daily['matched'].sum() / total_lemmas) * 100 if total_lemmas > 0 else 0:.1f}%")
+
+    # 每日各級別占比 (每天加總為 100%)
+    daily_ratio = level_mix.div(level_mix.sum(axis=1).replace(0, 1), axis=0) * 100
+    fig = px.area(daily_ratio, x=daily_ratio.index, y=LEVEL_ORDER,
+                  labels={'x': '日期', 'value': '占比 (%)', 'variable': '級別'},
+                  title="每日 N1 ~ N5 單字占比",
+                  color_discrete_sequence=px.colors.sequential.RdBu)
+    st.plotly_chart(fig, width='stretch')
+
+    level = st.selectbox("高頻單字級別", LEVEL_ORDER)
+    top_days = st.radio("期間", sorted({7, days}), format_func=lambda d: f"最近 {d} 天", horizontal=True)
+    top_words = load_top_words(level, top_days, vocab_index.version, vocab_index)
+    if top_words.empty:
+        st.info("這段期間沒有該級別的單字。")
+    else:
+        fig = px.bar(top_words, x='word', y='count', title=f"最近 {top_days} 天最常出現的 {level} 單字")
+        st.plotly_chart(fig, width='stretch')
+
 st.divider()
-st.caption("資料來源：NHK News Web. 本系統僅供學習使用。")
\ No newline at end of file
+st.caption("資料來源：NHK News Web. 本系統僅供學習使用。")
+
+# 冷啟動計時報告：每個行程只在第一次渲染完成時記錄並輸出一次
+if "first_render" not in startup.report():
+    startup.mark("first_render")
+    print(f"⏱️ 啟動計時: {startup.report()}")
+with st.sidebar.expander("⏱️ 啟動計時"):
+    st.json(startup.report())
\ No newline at end of file
@@ -1,43 +1,354 @@
 import pandas as pd
 from sudachipy import dictionary
+from collections import Counter
+from types import MappingProxyType
+import hashlib
 import os
+import re
 import subprocess
 import sys
+import threading
+import time
+import weakref
+from app import startup
+from app.matcher import LemmaMatcher
 
-def ensure_sudachi_dictionary():
-    """確保 Sudachi 字典已正確連結，支援 Streamlit Cloud 部署"""
+# 字典種類 (small / core / full)，可用環境變數切換
+SUDACHI_DICT = os.getenv("NHK_SUDACHI_DICT", "full")
+
+def ensure_sudachi_dictionary(dict_type=SUDACHI_DICT):
+    """
+    確保 Sudachi 字典已正確連結，支援 Streamlit Cloud 部署。
+    回傳建立好的 tokenizer，健康檢查與實際使用共用同一個物件，不會重複載入字典。
+    """
     try:
-        # 嘗試初始化，看 'full' 字典是否可用
-        dictionary.Dictionary(dict="full").create()
+        # 嘗試初始化，看字典是否可用
+        return dictionary.Dictionary(dict=dict_type).create()
     except (Exception, SystemExit):
         # 如果失敗，執行系統指令進行連結
         try:
             # 1. 執行 link 指令
-            subprocess.check_call(["sudachipy", "link", "-t", "full"])
-            print("Successfully linked sudachidict_full")
+            subprocess.check_call(["sudachipy", "link", "-t", dict_type])
+            print(f"Successfully linked sudachidict_{dict_type}")
         except Exception as e:
             # 如果還是失敗，可能是權限問題，嘗試安裝並連結
             print(f"Linking failed, attempting re-install: {e}")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "sudachidict_full"])
-            subprocess.check_call(["sudachipy", "link", "-t", "full"])
-
-# 在模組載入時執行一次
-ensure_sudachi_dictionary()
-
-# 初始化 tokenizer
-tokenizer_obj = dictionary.Dictionary(dict="full").create()
-mode = tokenizer_obj.SplitMode.C
-
-def analyze_jlpt_level(text, vocab_df):
-    if not text or vocab_df.empty:
-        return pd.Series([0,0,0,0,0], index=['N1','N2','N3','N4','N5'])
-
-    # 取得斷詞原型
-    tokens = [m.dictionary_form() for m in tokenizer_obj.tokenize(text, mode)]
-    
-    # 進行過濾
-    match_df = vocab_df[vocab_df['word'].isin(tokens)]
-    
-    level_order = ['N1', 'N2', 'N3', 'N4', 'N5']
-    counts = match_df['level'].value_counts().reindex(level_order, fill_value=0)
-    return counts
\ No newline at end of file
+            subprocess.check_call([sys.executable, "-m", "pip", "install", f"sudachidict_{dict_type}"])
+            subprocess.check_call(["sudachipy", "link", "-t", dict_type])
+        return dictionary.Dictionary(dict=dict_type).create()
+
+def create_tokenizer():
+    """建立一個新的 Sudachi tokenizer (每個行程各自持有一個)"""
+    return dictionary.Dictionary(dict=SUDACHI_DICT).create()
+
+# tokenizer 延遲到第一次斷詞時才建立 (匯入本模組不載入字典)
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+def get_tokenizer():
+    """取得行程內共用的 tokenizer，第一次呼叫時載入字典並記錄耗時與記憶體"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                rss_before = startup.resident_memory_mb()
+                start = time.perf_counter()
+                tokenizer = ensure_sudachi_dictionary()
+                startup.mark(
+                    "tokenizer_loaded",
+                    dict=SUDACHI_DICT,
+                    load_s=round(time.perf_counter() - start, 3),
+                    rss_delta_mb=round(startup.resident_memory_mb() - rss_before, 1),
+                )
+                _tokenizer = tokenizer
+    return _tokenizer
+
+LEVEL_ORDER = ['N1', 'N2', 'N3', 'N4', 'N5']
+
+# 儲存於資料庫的分析結果版本戳記：斷詞設定或比對邏輯改變時遞增，舊結果即視為過期
+ANALYZER_VERSION = 1
+TOKENIZER_STAMP = f"sudachi-{SUDACHI_DICT}-C/{ANALYZER_VERSION}"
+
+
+class VocabIndex:
+    """
+    編譯後的 JLPT 字彙索引：word -> 級別代碼 (0=N1 ... 4=N5) 的唯讀雜湊表。
+    只需從 load_vocab 的 DataFrame (或 app/vocab.py 的離線快照) 建立一次，之後每個 token 只做一次查表。
+    """
+    __slots__ = ('_codes', '_version', '__weakref__')
+
+    def __init__(self, codes, version=None):
+        self._codes = MappingProxyType(dict(codes))
+        self._version = version
+
+    @classmethod
+    def from_dataframe(cls, vocab_df):
+        code_of = {lv: i for i, lv in enumerate(LEVEL_ORDER)}
+        codes = {}
+        for word, level in zip(vocab_df['word'], vocab_df['level']):
+            code = code_of.get(level)
+            # 與 drop_duplicates(keep='first') 一致：重複單字以第一筆為準
+            if code is not None and word not in codes:
+                codes[word] = code
+        return cls(codes)
+
+    def level_code(self, word):
+        return self._codes.get(word)
+
+    def level_of(self, word):
+        code = self._codes.get(word)
+        return None if code is None else LEVEL_ORDER[code]
+
+    def __contains__(self, word):
+        return word in self._codes
+
+    def __len__(self):
+        return len(self._codes)
+
+    def items(self):
+        """(word, 級別代碼) 的唯讀檢視"""
+        return self._codes.items()
+
+    @property
+    def version(self):
+        """字彙內容的雜湊，作為已儲存分析結果的字彙版本戳記"""
+        if self._version is None:
+            digest = hashlib.sha1()
+            for word in sorted(self._codes):
+                digest.update(f"{word}\t{self._codes[word]}\n".encode('utf-8'))
+            self._version = digest.hexdigest()[:12]
+        return self._version
+
+    def __reduce__(self):
+        # MappingProxyType 無法 pickle，傳給子行程時以一般 dict 重建
+        return (VocabIndex, (dict(self._codes), self._version))
+
+
+# 以 DataFrame 物件身分快取已編譯的索引，Streamlit rerun 時 (cache_data 回傳同一物件) 不需重建
+_index_cache = {}
+
+def get_vocab_index(vocab):
+    """將 vocab_df 轉為 VocabIndex；已是 VocabIndex 則直接回傳"""
+    if isinstance(vocab, VocabIndex):
+        return vocab
+    key = id(vocab)
+    cached = _index_cache.get(key)
+    if cached is not None and cached[0]() is vocab:
+        return cached[1]
+    index = VocabIndex.from_dataframe(vocab)
+    _index_cache[key] = (weakref.ref(vocab, lambda _: _index_cache.pop(key, None)), index)
+    return index
+
+# Sudachi 單次 tokenize 的輸入上限 (位元組)；長文依句子切塊，每塊不超過 CHUNK_MAX_BYTES
+SUDACHI_MAX_BYTES = 49149
+CHUNK_MAX_BYTES = 16 * 1024
+
+# 句子：到句點、問號、驚嘆號或換行為止 (連續的句尾符號歸入同一句)
+_SENTENCE_RE = re.compile(r'[^。．！？!?\n]*(?:[。．！？!?\n]+|$)')
+
+def _split_oversized(sentence, max_bytes):
+    """沒有句尾符號的超長句子，依位元組上限在字元邊界硬切 (只編碼一次，依位元組位移前進)"""
+    data = sentence.encode('utf-8')
+    start = 0
+    while len(data) - start > max_bytes:
+        end = start + max_bytes
+        # 退回到 UTF-8 起始位元組 (非 10xxxxxx)，不把一個字元切成兩半
+        while end > start and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        yield data[start:end].decode('utf-8')
+        start = end
+    if start < len(data):
+        yield data[start:].decode('utf-8')
+
+def iter_sentence_chunks(text, max_bytes=CHUNK_MAX_BYTES):
+    """
+    依句子邊界把文字切成不超過 max_bytes 的區塊並逐一產生。
+    短於上限的文字只會產生一塊 (與整段斷詞結果相同)；text 也可以是逐行讀取的檔案等字串 iterable。
+    """
+    pieces = [text] if isinstance(text, str) else text
+    buffer, size = [], 0
+    for piece in pieces:
+        for match in _SENTENCE_RE.finditer(piece):
+            sentence = match.group()
+            if not sentence:
+                continue
+            for part in _split_oversized(sentence, max_bytes):
+                part_size = len(part.encode('utf-8'))
+                if buffer and size + part_size > max_bytes:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+                buffer.append(part)
+                size += part_size
+    if buffer:
+        yield "".join(buffer)
+
+def iter_lemmas(text, tokenizer=None, chunk_bytes=CHUNK_MAX_BYTES):
+    """逐塊斷詞並逐一產生斷詞原型 (dictionary_form)，同時只保留一塊的斷詞結果"""
+    tokenizer = tokenizer or get_tokenizer()
+    for chunk in iter_sentence_chunks(text, chunk_bytes):
+        for m in tokenizer.tokenize(chunk, tokenizer.SplitMode.C):
+            yield m.dictionary_form()
+
+def tokenize_lemmas(text, tokenizer=None):
+    """
+    取得斷詞原型 (dictionary_form) 列表；超過 Sudachi 輸入上限的長文會依句子切塊斷詞。
+    未指定 tokenizer 且有設定 NHK_ANALYZER_SOCKET 時交給常駐服務斷詞，失敗才在行程內載入字典。
+    """
+    if tokenizer is None and ANALYZER_SOCKET:
+        result = _lemmas_via_daemon([text])
+        if result is not None:
+            return result[0]
+    return list(iter_lemmas(text, tokenizer))
+
+# 多 token 字彙比對策略 (longest / overlap，見 app/matcher.py)
+MATCH_POLICY = os.getenv("NHK_MATCH_POLICY", "longest")
+
+_matchers = weakref.WeakKeyDictionary()
+_matcher_lock = threading.Lock()
+
+def get_matcher(index, tokenizer=None):
+    """取得由字彙索引編譯的多 token 比對器 (每個索引只編譯一次，需斷詞每個字彙)"""
+    matcher = _matchers.get(index)
+    if matcher is None:
+        with _matcher_lock:
+            matcher = _matchers.get(index)
+            if matcher is None:
+                tokenize = lambda word: tokenize_lemmas(word, tokenizer)
+                if tokenizer is None and ANALYZER_SOCKET:
+                    # 透過常駐服務時一次送出全部字彙，避免每個字彙各一次往返
+                    words = [word for word, _ in index.items()]
+                    lemma_lists = _lemmas_via_daemon(words)
+                    if lemma_lists is not None:
+                        tokenize = dict(zip(words, lemma_lists)).__getitem__
+                matcher = LemmaMatcher.from_index(index, tokenize)
+                _matchers[index] = matcher
+    return matcher
+
+def match_stamp(index):
+    """比對結果的版本戳記：字彙內容 + 比對策略，任一改變都只需以儲存的 lemmas 重新比對"""
+    return version_match_stamp(index.version)
+
+def version_match_stamp(version):
+    """只知道字彙版本 (例如只讀取快照檔標頭) 時的 match_stamp"""
+    return f"{version}/{MATCH_POLICY}"
+
+def count_levels(lemmas, index, matcher=None):
+    """
+    以多 token 比對器一次掃過 lemma 序列，回傳 (各級別不重複單字數 Series, 命中單字的出現次數 Counter)。
+    級別統計與原本 isin + value_counts 相同：每個單字只算一次。
+    """
+    token_counts = Counter()
+    matcher = matcher or get_matcher(index)
+    for _, _, word in matcher.iter_matches(lemmas, MATCH_POLICY):
+        token_counts[word] += 1
+    return levels_from_counts(token_counts, index), token_counts
+
+def levels_from_counts(token_counts, index):
+    """由命中單字的出現次數計算各級別不重複單字數 (可用於多段落合併後的 Counter)"""
+    lookup = index.level_code
+
+    level_counts = [0] * len(LEVEL_ORDER)
+    for word in token_counts:
+        level_counts[lookup(word)] += 1
+    return pd.Series(level_counts, index=pd.Index(LEVEL_ORDER, name='level'), name='count')
+
+def iter_level_counts(text, vocab, tokenizer=None, chunk_bytes=CHUNK_MAX_BYTES):
+    """
+    串流版的 count_levels：依句子切塊逐塊斷詞，並以多 token 比對器累加命中次數。
+    每處理完一塊 yield (目前的級別 Series, 累計 Counter, 已處理位元組數)，可用於逐步顯示結果；
+    記憶體只與單塊大小及命中的不重複單字數有關，與文章長度無關。
+    """
+    index = get_vocab_index(vocab)
+    tokenizer = tokenizer or get_tokenizer()
+    matcher = get_matcher(index, tokenizer)
+    token_counts = Counter()
+    done = 0
+    for chunk in iter_sentence_chunks(text, chunk_bytes):
+        lemmas = (m.dictionary_form() for m in tokenizer.tokenize(chunk, tokenizer.SplitMode.C))
+        for _, _, word in matcher.iter_matches(lemmas, MATCH_POLICY):
+            token_counts[word] += 1
+        done += len(chunk.encode('utf-8'))
+        yield levels_from_counts(token_counts, index), token_counts, done
+
+# 本機分析常駐服務的 socket (見 app/daemon.py)；設定後優先交給服務分析，行程內不必載入字典
+ANALYZER_SOCKET = os.getenv("NHK_ANALYZER_SOCKET")
+
+_daemon_warned = False
+
+def _analyze_via_daemon(text, vocab):
+    """送給常駐服務分析；連不上或版本不符時回傳 None (由呼叫端退回行程內分析)"""
+    from app.daemon import daemon_stamp
+    index = get_vocab_index(vocab)
+    result = _call_daemon(lambda client: client.analyze_many([text], daemon_stamp(index)))
+    return None if result is None else result[0]
+
+def _lemmas_via_daemon(texts):
+    """送給常駐服務斷詞；連不上或斷詞設定不符時回傳 None (由呼叫端退回行程內斷詞)"""
+    return _call_daemon(lambda client: client.lemmas_many(texts))
+
+def _call_daemon(request):
+    global _daemon_warned
+    from app.daemon import DaemonError, get_client
+    try:
+        return request(get_client(ANALYZER_SOCKET))
+    except (OSError, ValueError, DaemonError) as e:
+        if not _daemon_warned:
+            _daemon_warned = True
+            print(f"⚠️ 分析服務無法使用，改在行程內分析: {e}")
+        return None
+
+def analyze_jlpt_level(text, vocab_df, return_token_counts=False):
+    """
+    分析文本的 JLPT 級別分佈。vocab_df 可為 load_vocab 的 DataFrame 或已編譯的 VocabIndex。
+    return_token_counts=True 時另外回傳各命中單字的出現次數。
+    有設定 NHK_ANALYZER_SOCKET 時先交給常駐服務，失敗才在行程內斷詞。
+    """
+    counts = pd.Series([0,0,0,0,0], index=LEVEL_ORDER)
+    token_counts = Counter()
+    if text and len(vocab_df) > 0:
+        result = _analyze_via_daemon(text, vocab_df) if ANALYZER_SOCKET else None
+        if result is not None:
+            counts, token_counts = result
+        else:
+            for counts, token_counts, _ in iter_level_counts(text, vocab_df):
+                pass
+    return (counts, token_counts) if return_token_counts else counts
+
+def build_analysis(text, vocab):
+    """
+    產生要與文章一起儲存的分析結果：斷詞原型、各級別統計與版本戳記。
+    之後字彙表更新時可直接以 lemmas 重新比對，不需再次斷詞。
+    """
+    index = get_vocab_index(vocab)
+    lemmas = tokenize_lemmas(text) if text else []
+    counts, token_counts = count_levels(lemmas, index)
+    return {
+        "tokenizer": TOKENIZER_STAMP,
+        "vocab": match_stamp(index),
+        "lemmas": lemmas,
+        "levels": {lv: int(counts[lv]) for lv in LEVEL_ORDER},
+        "tokens": dict(token_counts),
+    }
+
+def refresh_analysis(analysis, text, vocab):
+    """
+    檢查已儲存分析結果的戳記：仍有效則原樣回傳；
+    僅字彙版本或比對策略過期時以儲存的 lemmas 重新比對；斷詞設定不同時才重新斷詞。
+    """
+    index = get_vocab_index(vocab)
+    if not isinstance(analysis, dict) or analysis.get("tokenizer") != TOKENIZER_STAMP:
+        return build_analysis(text, index)
+    if analysis.get("vocab") == match_stamp(index):
+        return analysis
+    counts, token_counts = count_levels(analysis.get("lemmas", []), index)
+    return {
+        **analysis,
+        "vocab": match_stamp(index),
+        "levels": {lv: int(counts[lv]) for lv in LEVEL_ORDER},
+        "tokens": dict(token_counts),
+    }
+
+def analysis_levels(analysis):
+    """將儲存的 levels 轉回與 analyze_jlpt_level 相同形狀的 Series"""
+    levels = analysis.get("levels", {})
+    return pd.Series([levels.get(lv, 0) for lv in LEVEL_ORDER], index=pd.Index(LEVEL_ORDER, name='level'), name='count')
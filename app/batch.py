@@ -0,0 +1,166 @@
+"""
+整批 JLPT 分析引擎：以多行程平行斷詞，依輸入順序串流回傳每篇文章的級別統計。
+
+每個 worker 在初始化時各自建立一次 Sudachi tokenizer、字彙索引與多 token 比對器；
+主行程同時最多只保留 max_pending 個未完成批次，記憶體用量與語料大小無關。
+
+來源可為 SQLite 文章資料庫 (*.db)、舊版 news_db.json 或純文字檔資料夾；
+資料庫來源加上 --write 時，會把新的分析結果 (含 lemmas 與版本戳記) 以 upsert_many 分批寫回。
+
+用法:
+    python -m app.batch data/news.db --processes 8 --write
+    python -m app.batch data/news_db.json
+    python -m app.batch path/to/texts/ --processes 8 --vocab data/jlpt_vocab.bin
+"""
+import argparse
+import glob
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from app.analyzer import (
+    LEVEL_ORDER, TOKENIZER_STAMP, count_levels, create_tokenizer, get_matcher, get_vocab_index, match_stamp,
+    tokenize_lemmas,
+)
+
+# 寫回資料庫時每個交易的文章數
+WRITE_BATCH = 64
+
+# --- worker 端狀態 (每個子行程各一份) ---
+_worker_tokenizer = None
+_worker_index = None
+_worker_matcher = None
+
+def _init_worker(index):
+    global _worker_tokenizer, _worker_index, _worker_matcher
+    _worker_tokenizer = create_tokenizer()
+    _worker_index = index
+    _worker_matcher = get_matcher(index, _worker_tokenizer)
+
+def _analyze_batch(batch, with_lemmas=False):
+    results = []
+    for key, text in batch:
+        lemmas = tokenize_lemmas(text, _worker_tokenizer) if text else []
+        if lemmas:
+            counts, token_counts = count_levels(lemmas, _worker_index, _worker_matcher)
+            levels = {lv: int(counts[lv]) for lv in LEVEL_ORDER}
+        else:
+            levels, token_counts = dict.fromkeys(LEVEL_ORDER, 0), {}
+        result = (key, levels, dict(token_counts))
+        results.append(result + (lemmas,) if with_lemmas else result)
+    return results
+
+def _batched(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def analyze_corpus(articles, vocab, processes=None, batch_size=8, max_pending=None, with_lemmas=False):
+    """
+    articles: 可迭代的 (key, text)。vocab: vocab_df 或 VocabIndex。
+    依輸入順序逐筆 yield (key, {'N1': .., ..., 'N5': ..}, {word: 出現次數})；
+    with_lemmas=True 時另附斷詞原型列表 (寫回資料庫時需要)。
+    """
+    index = get_vocab_index(vocab)
+    processes = processes or os.cpu_count() or 1
+    max_pending = max_pending or processes * 2
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(index,)) as pool:
+        pending = deque()
+        for batch in _batched(articles, batch_size):
+            pending.append(pool.submit(_analyze_batch, batch, with_lemmas))
+            # 控制在途批次數量，避免一次把整個語料讀進記憶體
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def iter_news_db(path):
+    """由 news_db.json 產生 (文章 ID, 全文)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        db = json.load(f)
+    for aid, article in db.items():
+        yield aid, "".join(article.get('content') or [])
+
+def iter_store(path):
+    """由 SQLite 文章資料庫產生 (文章 ID, 全文)，逐篇讀取內文"""
+    from backend.store import ArticleStore
+    store = ArticleStore(path)
+    try:
+        for row in store.list_articles():
+            record = store.get(row["id"])
+            if record:
+                yield row["id"], "".join(record.get("content") or [])
+    finally:
+        store.close()
+
+def write_results(store, results, index):
+    """
+    把 analyze_corpus(..., with_lemmas=True) 的結果寫回已開啟的 ArticleStore 的 analysis 欄位，
+    每 WRITE_BATCH 篇一個交易 (級別欄位、每日統計與倒排索引由 upsert_many 一併更新)。逐筆 yield 結果供輸出。
+    """
+    store.set_vocab(index)
+    vocab_stamp = match_stamp(index)
+    pending = {}
+    for key, levels, token_counts, lemmas in results:
+        record = store.get(key)
+        if record:
+            pending[key] = {**record, "analysis": {
+                "tokenizer": TOKENIZER_STAMP, "vocab": vocab_stamp,
+                "lemmas": lemmas, "levels": levels, "tokens": token_counts,
+            }}
+        if len(pending) >= WRITE_BATCH:
+            store.upsert_many(pending)
+            pending = {}
+        yield key, levels, token_counts
+    store.upsert_many(pending)
+
+def write_back(path, results, index):
+    """開啟 path 的文章資料庫，以 write_results 寫回分析結果"""
+    from backend.store import ArticleStore
+    store = ArticleStore(path)
+    try:
+        yield from write_results(store, results, index)
+    finally:
+        store.close()
+
+def iter_text_dir(path, pattern="*.txt"):
+    """由資料夾內的純文字檔產生 (檔名, 內容)，逐檔讀取"""
+    for file_path in sorted(glob.glob(os.path.join(path, pattern))):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            yield os.path.basename(file_path), f.read()
+
+def main():
+    from app.vocab import SNAPSHOT_PATH, load_vocab_index
+
+    parser = argparse.ArgumentParser(description="整批 JLPT 難度分析")
+    parser.add_argument('source', help="文章資料庫 (*.db)、news_db.json 或純文字檔資料夾")
+    parser.add_argument('--vocab', default=SNAPSHOT_PATH, help="字彙快照檔 (不存在時自動下載建立)")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--write', action='store_true', help="把結果寫回文章資料庫 (僅限 *.db 來源)")
+    args = parser.parse_args()
+
+    is_store = args.source.endswith(".db")
+    if args.write and not is_store:
+        parser.error("--write 只能用於文章資料庫 (*.db)")
+    if os.path.isdir(args.source):
+        articles = iter_text_dir(args.source)
+    elif is_store:
+        articles = iter_store(args.source)
+    else:
+        articles = iter_news_db(args.source)
+    vocab_index = load_vocab_index(args.vocab)
+    results = analyze_corpus(articles, vocab_index, args.processes, args.batch_size, with_lemmas=args.write)
+    if args.write:
+        results = write_back(args.source, results, vocab_index)
+    for key, levels, _ in results:
+        print(json.dumps({'id': key, **levels}, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+文章目錄：由資料庫的級別欄位建立 文章 × 級別 的 NumPy 計數矩陣。
+
+排序與篩選都是整個矩陣的向量運算，不需重新分析任何文章；
+分頁只對排序後的索引陣列切片，每頁的成本與文章總數無關。
+"""
+import numpy as np
+
+from app.analyzer import LEVEL_ORDER
+
+# 級別數值：N1=1 ... N5=5，用來計算文章的平均難度
+LEVEL_VALUES = np.arange(1, len(LEVEL_ORDER) + 1, dtype=np.float64)
+
+SORT_NEWEST = "newest"
+SORT_TARGET = "target"
+
+
+class ArticleMatrix:
+    def __init__(self, ids, titles, timestamps, counts):
+        self.ids = np.asarray(ids, dtype=object)
+        self.titles = list(titles)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int32).reshape(len(self.ids), len(LEVEL_ORDER))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: ArticleStore.list_articles() 的結果 (含 n1 ~ n5 欄位)"""
+        cols = [lv.lower() for lv in LEVEL_ORDER]
+        return cls(
+            [row["id"] for row in rows],
+            [row["title"] for row in rows],
+            [row["timestamp"] for row in rows],
+            [[row[col] for col in cols] for row in rows],
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def totals(self):
+        return self.counts.sum(axis=1)
+
+    def ratio(self, levels=('N1', 'N2', 'N3')):
+        """每篇文章中指定級別單字的占比 (0 ~ 1)，沒有命中任何單字的文章為 0"""
+        cols = [LEVEL_ORDER.index(lv) for lv in levels]
+        totals = self.totals
+        return np.divide(self.counts[:, cols].sum(axis=1), totals,
+                         out=np.zeros(len(self), dtype=np.float64), where=totals > 0)
+
+    def difficulty(self):
+        """每篇文章的平均級別 (1=N1 ... 5=N5，依各級別單字數加權)，沒有命中單字的文章為 NaN"""
+        totals = self.totals
+        weighted = self.counts @ LEVEL_VALUES
+        return np.divide(weighted, totals, out=np.full(len(self), np.nan), where=totals > 0)
+
+    def mask(self, ids=None, ratio_range=None, levels=('N1', 'N2', 'N3')):
+        """篩選條件：ids 為允許的文章 ID，ratio_range 為 (下限, 上限) 的級別占比 (0 ~ 1)"""
+        keep = np.ones(len(self), dtype=bool)
+        if ids is not None:
+            keep &= np.isin(self.ids, list(ids))
+        if ratio_range is not None:
+            ratio = self.ratio(levels)
+            keep &= (ratio >= ratio_range[0]) & (ratio <= ratio_range[1])
+        return keep
+
+    def order(self, sort=SORT_NEWEST, target=None, mask=None):
+        """
+        回傳排序後的列索引陣列。
+        SORT_NEWEST 依時間新到舊；SORT_TARGET 依平均級別與 target (例如 'N3') 的距離由近到遠。
+        """
+        if sort == SORT_TARGET:
+            distance = np.abs(self.difficulty() - (LEVEL_ORDER.index(target) + 1))
+            # 沒有命中單字的文章排在最後，距離相同時較新的文章優先
+            key = np.lexsort((-self.timestamps, np.nan_to_num(distance, nan=np.inf)))
+        elif sort == SORT_NEWEST:
+            key = np.argsort(-self.timestamps, kind='stable')
+        else:
+            raise ValueError(f"未知的排序方式: {sort}")
+        if mask is not None:
+            key = key[mask[key]]
+        return key
+
+    def page(self, order, page, page_size=20):
+        """取出第 page 頁 (從 0 開始) 的列索引"""
+        return order[page * page_size:(page + 1) * page_size]
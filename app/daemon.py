@@ -0,0 +1,234 @@
+"""
+本機 JLPT 分析常駐服務 (Unix socket)。
+
+同一台主機上的多個 Streamlit 行程與 sync_news 不必各自載入數百 MB 的 Sudachi 字典：
+常駐服務只持有一個 tokenizer 與字彙索引，透過 Unix socket 接收分析與斷詞請求。
+
+協定為 JSON lines，每行一個請求 / 回應:
+    分析請求: {"texts": ["...", ...]}
+    分析回應: {"stamp": "<斷詞設定>|<字彙版本>", "results": [{"levels": {"N1": ..}, "tokens": {word: 次數}}, ...]}
+    斷詞請求: {"op": "lemmas", "texts": ["...", ...]}
+    斷詞回應: {"stamp": "<斷詞設定>", "results": [["lemma", ...], ...]}
+    錯誤:     {"error": "..."}
+各連線的請求放進同一個佇列，由單一 worker 執行緒成批取出處理，tokenizer 不會被並行使用。
+用戶端比對 stamp 與自己的版本，不一致或連不上時由 analyze_jlpt_level / tokenize_lemmas 退回行程內處理。
+
+用法:
+    python -m app.daemon --socket data/analyzer.sock
+    NHK_ANALYZER_SOCKET=data/analyzer.sock streamlit run app.py
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+from collections import Counter
+
+from app import analyzer
+from app.analyzer import (
+    LEVEL_ORDER, TOKENIZER_STAMP, analysis_levels, get_matcher, get_tokenizer, get_vocab_index, iter_level_counts,
+    match_stamp, tokenize_lemmas,
+)
+
+DEFAULT_SOCKET = "data/analyzer.sock"
+OPS = ("analyze", "lemmas")
+MAX_BATCH = 32
+CLIENT_TIMEOUT = 30.0
+
+
+class DaemonError(Exception):
+    """常駐服務回傳錯誤或版本不符"""
+
+
+def daemon_stamp(index):
+    return f"{TOKENIZER_STAMP}|{match_stamp(index)}"
+
+
+class _Job:
+    __slots__ = ('op', 'texts', 'response', 'done')
+
+    def __init__(self, texts, op="analyze"):
+        self.op = op
+        self.texts = texts
+        self.response = None
+        self.done = threading.Event()
+
+
+class AnalysisEngine:
+    """持有唯一的 tokenizer 與比對器；各連線送來的請求由單一 worker 執行緒成批處理"""
+
+    def __init__(self, vocab, max_batch=MAX_BATCH):
+        self.index = get_vocab_index(vocab)
+        self.tokenizer = get_tokenizer()
+        get_matcher(self.index, self.tokenizer)  # 啟動時先編譯比對器
+        self.stamp = daemon_stamp(self.index)
+        self.max_batch = max_batch
+        self.batches = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="analysis-worker", daemon=True).start()
+
+    def submit(self, texts, op="analyze"):
+        job = _Job(texts, op)
+        self._queue.put(job)
+        job.done.wait()
+        return job.response
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < self.max_batch:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.batches += 1
+            self.requests += len(jobs)
+            for job in jobs:
+                try:
+                    if job.op == "lemmas":
+                        results = [tokenize_lemmas(text, self.tokenizer) if text else [] for text in job.texts]
+                        job.response = {"stamp": TOKENIZER_STAMP, "results": results}
+                    else:
+                        job.response = {"stamp": self.stamp, "results": [self._analyze(text) for text in job.texts]}
+                except Exception as e:
+                    job.response = {"error": f"分析失敗: {e}"}
+                job.done.set()
+
+    def _analyze(self, text):
+        levels, tokens = dict.fromkeys(LEVEL_ORDER, 0), {}
+        if text:
+            for counts, token_counts, _ in iter_level_counts(text, self.index, self.tokenizer):
+                pass
+            levels = {lv: int(counts[lv]) for lv in LEVEL_ORDER}
+            tokens = dict(token_counts)
+        return {"levels": levels, "tokens": tokens}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                texts, op = request["texts"], request.get("op", "analyze")
+                if not isinstance(texts, list):
+                    raise TypeError("texts 必須是字串列表")
+                if op not in OPS:
+                    raise ValueError(f"未知的 op: {op}")
+            except (ValueError, KeyError, TypeError) as e:
+                response = {"error": f"無效的請求: {e}"}
+            else:
+                response = self.server.engine.submit(texts, op)
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+
+
+class AnalysisServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # 預設的 listen backlog (5) 在大量用戶端同時連線時會讓 connect 直接失敗 (EAGAIN)
+    request_queue_size = 256
+
+    def __init__(self, path, engine):
+        if os.path.exists(path):
+            os.remove(path)  # 上次未正常結束留下的 socket 檔
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.engine = engine
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o660)
+
+
+class AnalysisClient:
+    """常駐服務的用戶端；一條連線可重複送出多個請求 (不可跨執行緒共用)"""
+
+    def __init__(self, path, timeout=CLIENT_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self._sock, self._file = sock, sock.makefile('rb')
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+    def _request(self, payload):
+        if self._sock is None:
+            self._connect()
+        self._sock.sendall(payload)
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("常駐服務已關閉連線")
+        return json.loads(line)
+
+    def analyze_many(self, texts, expected_stamp=None):
+        """
+        回傳與 texts 同順序的 [(級別 Series, 命中單字 Counter)]。
+        expected_stamp 與服務端的斷詞設定/字彙版本不符時拋出 DaemonError。
+        """
+        results = self._call({"texts": list(texts)}, expected_stamp)
+        return [(analysis_levels(result), Counter(result["tokens"])) for result in results]
+
+    def lemmas_many(self, texts, expected_stamp=TOKENIZER_STAMP):
+        """回傳與 texts 同順序的斷詞原型列表；服務端斷詞設定與 expected_stamp 不符時拋出 DaemonError"""
+        return self._call({"op": "lemmas", "texts": list(texts)}, expected_stamp)
+
+    def _call(self, request, expected_stamp):
+        payload = (json.dumps(request, ensure_ascii=False) + "\n").encode('utf-8')
+        try:
+            response = self._request(payload)
+        except OSError:
+            # 服務重啟後舊連線失效：重新連線再試一次
+            self.close()
+            response = self._request(payload)
+        if "error" in response:
+            raise DaemonError(response["error"])
+        if expected_stamp and response["stamp"] != expected_stamp:
+            raise DaemonError(f"版本不符: 服務端 {response['stamp']}，本機 {expected_stamp}")
+        return response["results"]
+
+
+_local = threading.local()
+
+
+def get_client(path):
+    """每個執行緒共用一條連線"""
+    client = getattr(_local, 'client', None)
+    if client is None or client.path != path:
+        client = _local.client = AnalysisClient(path)
+    return client
+
+
+def main():
+    from app.vocab import SNAPSHOT_PATH, load_vocab_index
+
+    parser = argparse.ArgumentParser(description="本機 JLPT 分析常駐服務")
+    parser.add_argument('--socket', default=os.getenv("NHK_ANALYZER_SOCKET") or DEFAULT_SOCKET)
+    parser.add_argument('--vocab', default=SNAPSHOT_PATH, help="字彙快照檔 (不存在時自動下載建立)")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    args = parser.parse_args()
+
+    # 服務本身一律在行程內斷詞，不會把請求再轉給自己
+    analyzer.ANALYZER_SOCKET = None
+    engine = AnalysisEngine(load_vocab_index(args.vocab), max_batch=args.max_batch)
+    with AnalysisServer(args.socket, engine) as server:
+        print(f"🧠 分析服務已啟動: {args.socket} ({engine.stamp})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(args.socket)
+            print(f"👋 分析服務已停止 (共處理 {engine.requests} 個請求，{engine.batches} 批)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+JLPT 字彙的多 token 比對器 (Aho-Corasick，以 lemma 序列為字母)。
+
+單一 dictionary_form() token 無法比對到跨多個 Sudachi token 的字彙 (文法表現、複合語等)。
+本模組把每個字彙編譯成 lemma 序列放進 trie，再加上 failure link，
+一次掃過 token 串流即可找出所有單 token 與多 token 的字彙，
+時間與文章長度成線性、與字彙量無關。
+
+比對策略:
+    longest : 由左至右、最長優先、不重疊 (預設)
+    overlap : 回報所有出現位置 (可重疊)
+"""
+from collections import deque
+
+POLICIES = ('longest', 'overlap')
+
+
+class LemmaMatcher:
+    def __init__(self, patterns):
+        """patterns: {lemma 序列 (tuple): 字彙}"""
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self.max_len = 0
+
+        for lemmas, word in patterns.items():
+            if not lemmas:
+                continue
+            node = 0
+            for lemma in lemmas:
+                nxt = self._goto[node].get(lemma)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][lemma] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = nxt
+            self._out[node] = ((len(lemmas), word),)
+            self.max_len = max(self.max_len, len(lemmas))
+
+        # BFS 建立 failure link，並把後綴節點的輸出併入 (輸出依長度由長到短)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for lemma, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and lemma not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(lemma, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    @classmethod
+    def from_index(cls, index, tokenize):
+        """
+        由 VocabIndex 建立比對器。每個字彙本身都是一個單 token 模式 (與原本的比對相同)；
+        若以 tokenize 斷詞後的 lemma 序列不同 (多 token 或原型不同)，再加入該序列作為模式。
+        """
+        patterns = {(word,): word for word, _ in index.items()}
+        for word, _ in index.items():
+            lemmas = tuple(tokenize(word))
+            if lemmas and lemmas not in patterns:
+                patterns[lemmas] = word
+        return cls(patterns)
+
+    def _step(self, node, lemma):
+        goto, fail = self._goto, self._fail
+        while node and lemma not in goto[node]:
+            node = fail[node]
+        return goto[node].get(lemma, 0)
+
+    def iter_matches(self, lemmas, policy='longest'):
+        """
+        對 lemma 串流 (任意 iterable) 逐一產生 (start, end, word)。
+        longest 策略只需保留最多 max_len 個位置的暫存，可用於無限長的串流。
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"未知的比對策略: {policy}")
+
+        node = 0
+        candidates = {}   # start -> (length, word)，longest 策略尚未決定的候選
+        cursor = 0        # 下一個要決定的起點
+        covered = 0       # 已被選取的比對覆蓋到的位置 (不含)
+        pos = -1
+
+        for pos, lemma in enumerate(lemmas):
+            node = self._step(node, lemma)
+            for length, word in self._out[node]:
+                start = pos - length + 1
+                if policy == 'overlap':
+                    yield start, pos + 1, word
+                elif length > candidates.get(start, (0, None))[0]:
+                    candidates[start] = (length, word)
+            if policy == 'longest':
+                # 起點 <= pos - max_len + 1 的所有比對都已出現，可以定案
+                while cursor <= pos - self.max_len + 1:
+                    cursor, covered = yield from self._decide(candidates, cursor, covered)
+
+        if policy == 'longest':
+            while cursor <= pos:
+                cursor, covered = yield from self._decide(candidates, cursor, covered)
+
+    @staticmethod
+    def _decide(candidates, cursor, covered):
+        best = candidates.pop(cursor, None)
+        if best and cursor >= covered:
+            length, word = best
+            yield cursor, cursor + length, word
+            covered = cursor + length
+        return cursor + 1, covered
@@ -0,0 +1,116 @@
+"""
+段落層級的 JLPT 分析快取。
+
+以 (斷詞設定, 字彙版本, 段落內容) 的雜湊為鍵，保存每段命中單字的出現次數；
+長文只重新斷詞有變動或第一次出現的段落，再把各段的 Counter 合併成全文統計。
+快取在記憶體中，總大小超過 max_bytes 時淘汰最久未使用的段落 (LRU)。
+"""
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+import pandas as pd
+
+from app import analyzer
+from app.analyzer import (
+    LEVEL_ORDER, TOKENIZER_STAMP, analyze_jlpt_level, get_vocab_index, iter_level_counts, levels_from_counts,
+    match_stamp,
+)
+
+CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# 每個快取項目的固定開銷估計 (鍵、Counter 與 OrderedDict 節點)
+_ENTRY_OVERHEAD = 400
+_WORD_OVERHEAD = 100
+
+
+def split_paragraphs(text):
+    """自訂文章依換行切成段落 (去除空行)"""
+    return [line for line in text.splitlines() if line.strip()]
+
+
+def _entry_size(token_counts):
+    return _ENTRY_OVERHEAD + sum(len(word.encode('utf-8')) + _WORD_OVERHEAD for word in token_counts)
+
+
+class ParagraphAnalysisCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> (Counter, size)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(paragraph, stamp):
+        return hashlib.sha256(f"{stamp}\0{paragraph}".encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, key, token_counts):
+        size = _entry_size(token_counts)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (token_counts, size)
+            self._size += size
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def iter_analyze(self, paragraphs, vocab):
+        """
+        逐段分析並合併，每處理完一段 yield (目前的級別 Series, 累計 Counter, 已處理段數)，供畫面逐步更新。
+        在行程內斷詞的長段落每處理完一個區塊也會 yield 一次，已處理段數為小數 (例如 0.5 表示第一段處理到一半)。
+        只有快取中沒有的段落才會斷詞；跨段落的多 token 字彙不會被比對到。
+        """
+        if len(vocab) == 0:
+            yield pd.Series([0] * len(LEVEL_ORDER), index=LEVEL_ORDER), Counter(), len(paragraphs)
+            return
+
+        index = get_vocab_index(vocab)
+        stamp = f"{TOKENIZER_STAMP}|{match_stamp(index)}"
+        total = Counter()
+        for done, paragraph in enumerate(paragraphs, start=1):
+            if paragraph:
+                key = self.key(paragraph, stamp)
+                token_counts = self._get(key)
+                if token_counts is None:
+                    # 有設定分析常駐服務時由服務斷詞，否則在行程內逐塊串流斷詞並回報區塊層級的進度
+                    if analyzer.ANALYZER_SOCKET:
+                        _, token_counts = analyze_jlpt_level(paragraph, index, return_token_counts=True)
+                    else:
+                        token_counts = Counter()
+                        size = len(paragraph.encode('utf-8'))
+                        for _, token_counts, done_bytes in iter_level_counts(paragraph, index):
+                            if done_bytes < size:
+                                partial = total + token_counts
+                                yield levels_from_counts(partial, index), partial, done - 1 + done_bytes / size
+                    self._put(key, token_counts)
+                total.update(token_counts)
+            yield levels_from_counts(total, index), total, done
+
+    def analyze(self, paragraphs, vocab):
+        """回傳 (各級別不重複單字數 Series, 全文命中單字出現次數 Counter)，與 analyze_jlpt_level 相同形狀"""
+        levels = pd.Series([0] * len(LEVEL_ORDER), index=LEVEL_ORDER)
+        total = Counter()
+        for levels, total, _ in self.iter_analyze(paragraphs, vocab):
+            pass
+        return levels, total
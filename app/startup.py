@@ -0,0 +1,36 @@
+"""
+冷啟動計時：記錄從行程載入到各階段 (匯入完成、字典載入、首次渲染) 的耗時與常駐記憶體。
+請在 app.py 最先匯入本模組，起點才會接近行程啟動時間。
+"""
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組
+    resource = None
+
+_T0 = time.perf_counter()
+_marks = {}
+
+def resident_memory_mb():
+    """目前常駐記憶體 (MB)；非 Linux 平台退回使用峰值 ru_maxrss，Windows 等無法取得時回傳 0"""
+    if resource is None:
+        return 0.0
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 1024 / 1024
+    except (OSError, IndexError, ValueError):
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 單位為 bytes，Linux 為 KB
+        return maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+
+def mark(name, **extra):
+    """記錄某階段第一次到達的時間點 (秒，相對於行程啟動) 與當下記憶體"""
+    if name not in _marks:
+        _marks[name] = {"elapsed_s": round(time.perf_counter() - _T0, 3), "rss_mb": round(resident_memory_mb(), 1), **extra}
+    return _marks[name]
+
+def report():
+    return dict(_marks)
@@ -1,15 +1,167 @@
-from googletrans import Translator
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 
-# 使用 st.cache_resource 避免重複初始化
+CACHE_PATH = "data/translation_cache.db"
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+class GoogleTransBackend:
+    """googletrans 後端；每個執行緒各自持有一個 Translator"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def translate(self, text, dest):
+        if not hasattr(self._local, 'translator'):
+            from googletrans import Translator
+            self._local.translator = Translator()
+        return self._local.translator.translate(text, dest=dest).text
+
+class FakeBackend:
+    """離線測試用的假翻譯器：不連網，回傳加上標記的原文並記錄呼叫次數"""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def translate(self, text, dest):
+        with self._lock:
+            self.calls += 1
+        return f"[{dest}] {text}"
+
+BACKENDS = {
+    'google': GoogleTransBackend,
+    'fake': FakeBackend,
+}
+
+def cache_key(text, dest):
+    return hashlib.sha256(f"{dest}\0{text}".encode('utf-8')).hexdigest()
+
+class TranslationCache:
+    """
+    以 (原文, 目標語言) 雜湊為鍵的磁碟翻譯快取 (SQLite)。
+    總大小超過 max_bytes 時，依最後使用時間淘汰 (LRU)。
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)")
+            self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    def get_many(self, keys):
+        """回傳 {key: 譯文}，只包含命中的項目，並更新其最後使用時間"""
+        keys = list(set(keys))
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT key, result FROM translations WHERE key IN ({placeholders})", keys
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE translations SET last_used = ? WHERE key = ?", [(time.time(), key) for key, _ in rows]
+            )
+        return dict(rows)
+
+    def put_many(self, items):
+        """
+        items: {key: 譯文}。超過 max_bytes 的單一譯文不快取；
+        淘汰時不會刪掉本批剛寫入的項目 (本批總量超過上限時，依序只寫入放得下的部分)。
+        """
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            batch_size = 0
+            for key, result in items.items():
+                size = len(result.encode('utf-8'))
+                if batch_size + size > self.max_bytes:
+                    continue
+                batch_size += size
+                old = self._conn.execute("SELECT size FROM translations WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO translations (key, result, size, last_used) VALUES (?, ?, ?, ?)",
+                    (key, result, size, now),
+                )
+                self._size += size - (old[0] if old else 0)
+            self._evict(before=now)
+
+    def _evict(self, before):
+        """依最後使用時間 (同時間者依寫入順序) 淘汰，只考慮 last_used 早於 before 的項目"""
+        while self._size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM translations WHERE last_used < ? ORDER BY last_used, rowid LIMIT 64", (before,)
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM translations WHERE key = ?", (key,))
+                self._size -= size
+
+class TranslationService:
+    """快取 + 去重 + 有上限並行的翻譯服務，backend 可抽換 (測試時使用 FakeBackend)"""
+
+    def __init__(self, backend, cache, max_workers=4):
+        self.backend = backend
+        self.cache = cache
+        self.max_workers = max_workers
+
+    def translate(self, text, dest='zh-tw'):
+        return self.translate_many([text], dest)[0]
+
+    def translate_many(self, texts, dest='zh-tw'):
+        """依輸入順序回傳譯文；重複段落只翻一次，已快取的段落不再送出請求"""
+        keys = [cache_key(text, dest) for text in texts]
+        results = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in results and key not in missing:
+                missing[key] = text
+
+        translated, errors = {}, {}
+
+        def work(item):
+            key, text = item
+            try:
+                translated[key] = self.backend.translate(text, dest)
+            except Exception as e:
+                errors[key] = f"翻譯出錯: {e}"
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                list(pool.map(work, missing.items()))
+            # 只快取成功的結果，錯誤訊息不寫入
+            self.cache.put_many(translated)
+
+        results.update(translated)
+        results.update(errors)
+        return [results[key] for key in keys]
+
+# 使用 st.cache_resource 避免重複初始化，所有 session 共用同一份快取
 @st.cache_resource
-def get_translator():
-    return Translator()
+def get_translation_service():
+    backend = BACKENDS[os.getenv("NHK_TRANSLATOR", "google")]()
+    return TranslationService(backend, TranslationCache())
 
 def translate_text(text, dest='zh-tw'):
-    translator = get_translator()
-    try:
-        result = translator.translate(text, dest=dest)
-        return result.text
-    except Exception as e:
-        return f"翻譯出錯: {e}"
\ No newline at end of file
+    return get_translation_service().translate(text, dest)
+
+def translate_many(texts, dest='zh-tw'):
+    return get_translation_service().translate_many(texts, dest)
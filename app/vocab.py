@@ -0,0 +1,138 @@
+"""
+JLPT 字彙表的讀取、清理與離線快照。
+
+快照檔 (預設 data/jlpt_vocab.bin) 為精簡的二進位格式，載入時只需兩次 C 層級操作，
+不需要網路也不需要 pandas 清理：
+
+    header  : struct "<8sII16sd" = magic, 單字數, 字串區長度, 字彙版本, 建立時間
+    levels  : 單字數個 uint8 級別代碼 (0=N1 ... 4=N5)，與字串區順序對應
+    words   : 依 UTF-8 位元組排序、以 '\\n' 分隔的單字字串區
+
+用法:
+    python -m app.vocab build [--source JLPTWords.csv] [--out data/jlpt_vocab.bin]
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+
+from app.analyzer import LEVEL_ORDER, VocabIndex
+
+VOCAB_URL = "https://raw.githubusercontent.com/Bluskyo/JLPT_Vocabulary/main/data/results/JLPTWords.csv"
+SNAPSHOT_PATH = "data/jlpt_vocab.bin"
+
+SNAPSHOT_MAGIC = b"JLPTVOC1"
+SNAPSHOT_HEADER = struct.Struct("<8sII16sd")
+
+def clean_vocab(df):
+    """
+    將原始 JLPTWords.csv 整理成 ['word', 'level'] 兩欄。
+    欄位不符時拋出 ValueError，由呼叫端決定如何呈現錯誤。
+    """
+    # 1. 強制清理欄位名稱：去除首尾空白並轉為小寫
+    # 這樣無論 CSV 是 "Word" 還是 "word" 都能對齊
+    df.columns = df.columns.str.strip().str.lower()
+
+    # 2. 我們需要的是 'word' 和 'jlptlevel'，重新命名以便後續代碼統一使用
+    if 'word' not in df.columns or 'jlptlevel' not in df.columns:
+        raise ValueError(f"CSV 結構不符。現有欄位: {list(df.columns)}")
+    df = df.rename(columns={'jlptlevel': 'level'})
+
+    # 3. 數據清洗
+    df['word'] = df['word'].astype(str).str.strip()
+    df['level'] = df['level'].astype(str).str.strip()
+
+    # 4. 格式標準化：確保 Level 顯示為 N1, N2...
+    # 有些資料會存成 "1" 或 "n1"，我們統一轉換
+    def format_level(lv):
+        lv = lv.upper()
+        return lv if lv.startswith('N') else f"N{lv}"
+
+    df['level'] = df['level'].apply(format_level)
+
+    # 5. 移除重複項，確保每個單字只有一個難度分級
+    df = df.drop_duplicates(subset=['word'], keep='first')
+
+    return df[['word', 'level']]
+
+def load_vocab_df(source=VOCAB_URL):
+    """從 URL 或本機 CSV 讀取並清理 JLPT 字彙表 (不依賴 Streamlit，供批次與同步腳本使用)"""
+    import pandas as pd
+    return clean_vocab(pd.read_csv(source))
+
+def write_snapshot(index, path=SNAPSHOT_PATH):
+    """將 VocabIndex 寫成快照檔 (先寫暫存檔再原子替換)"""
+    entries = sorted(
+        ((word.encode('utf-8'), code) for word, code in index.items() if '\n' not in word),
+        key=lambda item: item[0],
+    )
+    words = b"\n".join(word for word, _ in entries)
+    levels = bytes(code for _, code in entries)
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(entries), len(words), index.version.encode('ascii'), time.time())
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(levels)
+        f.write(words)
+    os.replace(tmp_path, path)
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """讀取快照檔並回傳 VocabIndex；格式不符時拋出 ValueError"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        magic, count, words_len, version, _ = SNAPSHOT_HEADER.unpack_from(buf, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"不是 JLPT 字彙快照檔: {path}")
+        offset = SNAPSHOT_HEADER.size
+        levels = buf[offset:offset + count]
+        words = buf[offset + count:offset + count + words_len].decode('utf-8').split('\n') if count else []
+    if len(words) != count or max(levels, default=0) >= len(LEVEL_ORDER):
+        raise ValueError(f"快照檔內容毀損: {path}")
+    return VocabIndex(zip(words, levels), version=version.rstrip(b"\0").decode('ascii'))
+
+def read_snapshot_version(path=SNAPSHOT_PATH):
+    """只讀取快照檔標頭的字彙版本，不載入單字；快照不存在或格式不符時回傳 None"""
+    try:
+        with open(path, 'rb') as f:
+            magic, _, _, version, _ = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+    except (OSError, struct.error):
+        return None
+    if magic != SNAPSHOT_MAGIC:
+        return None
+    return version.rstrip(b"\0").decode('ascii')
+
+def build_snapshot(source=VOCAB_URL, path=SNAPSHOT_PATH):
+    """下載 (或讀取本機) CSV、清理後寫成快照檔，回傳 VocabIndex"""
+    index = VocabIndex.from_dataframe(load_vocab_df(source))
+    write_snapshot(index, path)
+    return index
+
+def load_vocab_index(path=SNAPSHOT_PATH, refresh=False, source=VOCAB_URL):
+    """
+    優先從本機快照載入字彙索引；快照不存在、毀損或 refresh=True 時才從網路重建。
+    """
+    if not refresh and os.path.exists(path):
+        try:
+            return read_snapshot(path)
+        except (ValueError, struct.error) as e:
+            print(f"⚠️ 字彙快照無法讀取，改為重新下載: {e}")
+    return build_snapshot(source, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="建立 JLPT 字彙離線快照")
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('--source', default=VOCAB_URL, help="JLPTWords.csv 的 URL 或本機路徑")
+    parser.add_argument('--out', default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = build_snapshot(args.source, args.out)
+    else:
+        index = read_snapshot(args.out)
+    print(f"📚 {args.out}: {len(index)} 個單字，版本 {index.version}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+並行抓取模式：以 Playwright async API 在同一個 Context 中開多個 Page 同時抓取文章。
+
+- concurrency：同時使用的 Page 數量上限
+- HostRateLimiter：依 host 控制請求間隔，取代逐篇 time.sleep(1) (逐篇抓取模式也共用)
+- timeout：單篇文章的逾時秒數，逾時的 Page 會被關閉並換新
+"""
+import asyncio
+import threading
+import time
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright
+
+from backend.crawl import (
+    BODY_WAIT_TIMEOUT, BROWSER_ARGS, MATCHES_JS, MODAL_CONFIRM_TEXT, MODAL_SELECTOR, MODAL_STEP_TIMEOUT, STATE_PATH,
+    ConsentState, TrafficStats, context_options, is_blocked_request,
+)
+from backend.extract import (
+    ARTICLE_BODY_SELECTOR, extract_article_paragraphs, extract_from_page_async, use_browser_extraction,
+)
+from backend.metrics import NullTrace
+
+
+class HostRateLimiter:
+    """
+    友善爬蟲：同一個 host 的兩次請求之間至少間隔 min_interval 秒。
+    並行模式以 await wait(url)、逐篇模式以 wait_sync(url) 等待。
+    """
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        """預約該 host 的下一個請求時段，回傳還需等待的秒數"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        return slot - now
+
+    async def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait_sync(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+
+async def setup_browser_context_async(p, state_path=STATE_PATH):
+    """setup_browser_context 的 async 版本"""
+    browser = await p.chromium.launch(headless=True, args=BROWSER_ARGS)
+    context = await browser.new_context(**context_options(state_path))
+    return browser, context
+
+
+async def enable_lean_mode_async(page):
+    """enable_lean_mode 的 async 版本"""
+    stats = TrafficStats()
+
+    async def handle_route(route):
+        if is_blocked_request(route.request):
+            stats.blocked_requests += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def record_request(request):
+        try:
+            stats.record_sizes(await request.sizes())
+        except Exception:
+            stats.requests += 1
+
+    await page.route("**/*", handle_route)
+    page.on("requestfinished", record_request)
+    return stats
+
+
+async def bypass_nhk_modals_async(page):
+    """bypass_nhk_modals 的 async 版本 (Level 1, 2, 3)，回傳是否點到第三層的確認按鈕"""
+    try:
+        if await page.get_by_text("内容について確認しました").is_visible():
+            await page.get_by_text("内容について確認しました").click()
+            await page.get_by_role("button", name="次へ").click()
+
+            household = page.get_by_label("世帯(個人)で")
+            await household.wait_for(state="visible", timeout=MODAL_STEP_TIMEOUT)
+            await household.check()
+            await page.locator("select").select_option(index=1)
+            await page.get_by_role("button", name="サービスの利用を開始する").click()
+            print("✅ 擊穿前兩層導覽")
+    except Exception:
+        pass
+
+    try:
+        target_btn = page.get_by_role("button", name=MODAL_CONFIRM_TEXT).or_(
+            page.locator("button.esl7kn2s").filter(has_text=MODAL_CONFIRM_TEXT)
+        ).first
+        try:
+            await target_btn.wait_for(state="visible", timeout=MODAL_STEP_TIMEOUT)
+        except PlaywrightTimeoutError:
+            await page.mouse.wheel(0, 1000)
+            await target_btn.wait_for(state="visible", timeout=MODAL_STEP_TIMEOUT)
+
+        await target_btn.scroll_into_view_if_needed()
+        await target_btn.click(force=True)
+        print(f"✅ 成功執行點擊：{MODAL_CONFIRM_TEXT}")
+        return True
+    except Exception as e:
+        print(f"⚠️ 處理第三層按鈕發生錯誤: {e}")
+        return False
+
+
+async def wait_for_body_or_modal_async(page, consent_confirmed=False):
+    """wait_for_body_or_modal 的 async 版本 (尚未記錄同意狀態時，等到內文後仍確認頁面上沒有遮罩)"""
+    handle = await page.wait_for_selector(f"{ARTICLE_BODY_SELECTOR}, {MODAL_SELECTOR}", timeout=BODY_WAIT_TIMEOUT)
+    if not await handle.evaluate(MATCHES_JS, ARTICLE_BODY_SELECTOR):
+        return False
+    if consent_confirmed:
+        return True
+    await page.wait_for_load_state("domcontentloaded")
+    return await page.locator(MODAL_SELECTOR).count() == 0
+
+
+async def wait_for_modal_closed_async(page):
+    """wait_for_modal_closed 的 async 版本：等遮罩消失並等 DOM 載入完成，避免擷取到預覽段落"""
+    await page.locator(MODAL_SELECTOR).first.wait_for(state="hidden", timeout=BODY_WAIT_TIMEOUT)
+    await page.wait_for_load_state("domcontentloaded")
+
+
+async def fetch_article_full_text_async(url, page, traffic=None, trace=None, consent=None):
+    """fetch_article_full_text 的 async 版本，例外交由呼叫端處理"""
+    trace = trace or NullTrace()
+    if traffic:
+        start, before = time.perf_counter(), traffic.snapshot()
+    with trace.span("goto"):
+        await page.goto(url, wait_until="commit")
+    with trace.span("modal_detect") as span:
+        body_first = await wait_for_body_or_modal_async(page, consent_confirmed=bool(consent and consent.confirmed))
+        span["path"] = "fast" if body_first else "slow"
+    bypassed = False
+    if not body_first:
+        print("⚠️ 偵測到遮罩層，嘗試進行穿透...")
+        with trace.span("modal_bypass"):
+            bypassed = await bypass_nhk_modals_async(page)
+            if bypassed:
+                await wait_for_modal_closed_async(page)
+    if consent:
+        consent.record(not body_first, bypassed)
+    if not body_first and not bypassed:
+        raise RuntimeError("無法穿透遮罩")
+    with trace.span("extract") as span:
+        if not body_first:
+            await page.wait_for_selector(ARTICLE_BODY_SELECTOR, timeout=BODY_WAIT_TIMEOUT)
+        if use_browser_extraction():
+            paragraphs = await extract_from_page_async(page)
+        else:
+            html_content = await page.content()
+            span["bytes"] = len(html_content.encode('utf-8'))
+            paragraphs = extract_article_paragraphs(html_content)
+    if traffic:
+        trace.bytes += traffic.snapshot()[2] - before[2]
+        traffic.log_article(before, time.perf_counter() - start)
+    else:
+        trace.bytes += span.get("bytes", 0)
+    return paragraphs
+
+
+async def fetch_articles_async(rows, concurrency=4, min_interval=1.0, timeout=60.0, state_path=STATE_PATH, lean=True,
+                               metrics=None):
+    """
+    rows: 可迭代的 (aid, url)。回傳 {aid: 段落列表}，依輸入順序排列；失敗或逾時的文章為空列表。
+    lean=True 時每個 Page 都啟用精簡模式 (擋下圖片/字型/追蹤請求)。
+    metrics 為 SyncMetrics 時記錄瀏覽器啟動與每篇文章各階段的耗時。
+    尚未記錄遮罩同意狀態時，先以單一 Page 抓第一篇完成穿透，其餘文章再並行抓取 (共用同一個 Context 的 Cookie)。
+    """
+    rows = list(rows)
+    results = {aid: [] for aid, _ in rows}
+    if not rows:
+        return results
+
+    limiter = HostRateLimiter(min_interval)
+    consent = ConsentState(state_path)
+    async with async_playwright() as p:
+        with metrics.span("browser_launch") if metrics else nullcontext():
+            browser, context = await setup_browser_context_async(p, state_path)
+        traffic = {}
+
+        async def new_page():
+            page = await context.new_page()
+            traffic[page] = await enable_lean_mode_async(page) if lean else None
+            return page
+
+        pages = asyncio.Queue()
+        for _ in range(min(concurrency, len(rows))):
+            pages.put_nowait(await new_page())
+
+        async def worker(aid, url):
+            page = await pages.get()
+            trace = metrics.article(aid, url) if metrics else NullTrace()
+            try:
+                await limiter.wait(url)
+                start = time.perf_counter()
+                results[aid] = await asyncio.wait_for(fetch_article_full_text_async(url, page, traffic[page], trace, consent), timeout)
+                print(f"🔍 [{aid}] {len(results[aid])} 段 ({time.perf_counter() - start:.1f}s)")
+                trace.finish(results[aid])
+            except asyncio.TimeoutError:
+                print(f"⏱️ [{aid}] 抓取逾時 ({timeout}s)，更換 Page")
+                trace.finish(outcome="timeout")
+                await page.close()
+                page = await new_page()
+            except Exception as e:
+                print(f"❌ [{aid}] 抓取全文失敗: {e}")
+                trace.finish(outcome="error")
+            finally:
+                pages.put_nowait(page)
+
+        try:
+            if not consent.confirmed:
+                await worker(*rows[0])
+                rows = rows[1:]
+            await asyncio.gather(*(worker(aid, url) for aid, url in rows))
+            consent.log_summary()
+            if lean:
+                totals = [stats.snapshot() for stats in traffic.values()]
+                print(f"📦 精簡模式合計: 下載 {sum(t[2] for t in totals) / 1024:.0f} KB，擋下 {sum(t[1] for t in totals)} 個請求 (未下載)")
+        finally:
+            print("⏳ 正在儲存 Playwright 狀態檔...")
+            consent.save(await context.storage_state())
+            await browser.close()
+    return results
+
+
+def fetch_articles_concurrently(rows, **kwargs):
+    """同步程式碼 (sync_news.run_sync) 的進入點"""
+    return asyncio.run(fetch_articles_async(rows, **kwargs))
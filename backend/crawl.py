@@ -2,68 +2,277 @@ import pandas as pd
 import os
 import subprocess
 import sys
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
-import urllib.request
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError, sync_playwright
+import gzip
+import http.client
 import json
+import time
+from urllib.parse import urlsplit
+from backend.extract import ARTICLE_BODY_SELECTOR, extract_article_paragraphs, extract_from_page, use_browser_extraction
+from backend.metrics import NullTrace
 
-def fetch_nhk_news():
-    api_url = "https://www3.nhk.or.jp/news/json16/new_001.json"
+# NHK 端點可用環境變數覆寫，方便以本機 HTTP 伺服器提供測試頁面
+NHK_LIST_URL = os.getenv("NHK_LIST_URL", "https://www3.nhk.or.jp/news/json16/new_001.json")
+NHK_ARTICLE_URL = os.getenv("NHK_ARTICLE_URL", "https://news.web.nhk/newsweb/na/na-{id}")
+STATE_PATH = "data/playwright_state.json"
+# 新聞清單的 ETag / Last-Modified 與上次的清單內容
+LIST_STATE_PATH = "data/nhk_list_state.json"
+
+BROWSER_ARGS = [
+    "--headless=new",
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-gpu",
+    "--disable-infobars"
+]
+
+# 第三層遮罩的確認按鈕文字
+MODAL_CONFIRM_TEXT = "確認しました / I understand"
+
+# 內文節點與遮罩節點 (精簡模式下，只等其中之一出現即可繼續)
+MODAL_SELECTOR = f"button:has-text('{MODAL_CONFIRM_TEXT}'), :text('内容について確認しました')"
+BODY_WAIT_TIMEOUT = 30000
+# 穿透遮罩時每一步等待下一個元素出現的上限 (取代固定的 wait_for_timeout)
+MODAL_STEP_TIMEOUT = 5000
+# 判斷 wait_for_selector 先等到的是否為內文節點
+MATCHES_JS = "(el, selector) => el.matches(selector)"
+# 同意狀態存在 STATE_PATH 內的欄位 (載入 Context 時會去掉，只傳 cookies / origins 給 Playwright)
+CONSENT_KEY = "nhk_consent"
+
+# 精簡模式：擷取內文用不到的資源類型與第三方追蹤網域
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "googlesyndication.com", "facebook.net", "scorecardresearch.com",
+    "adobedtm.com", "omtrdc.net", "demdex.net", "chartbeat.com", "chartbeat.net",
+)
+
+class TrafficStats:
+    """
+    精簡模式的流量統計：放行的請求數與實際下載位元組數、擋下的請求數。
+    被擋下的請求在送出前就中止，沒有回應可讀 Content-Length，因此只記錄請求數而不估算節省的位元組；
+    節省的流量可與 --no-lean 執行時的下載量比較。
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.blocked_requests = 0
+        self.bytes = 0
+
+    def record_sizes(self, sizes):
+        """
+        以 request.sizes() 的 responseBodySize (實際收到的 body 位元組) 計算流量；
+        壓縮、chunked 或 HTTP/2 回應常沒有 Content-Length，不能只看標頭。
+        """
+        self.requests += 1
+        self.bytes += max(sizes.get("responseBodySize", 0), 0)
+
+    def record_request(self, request):
+        """requestfinished 事件處理 (sync API)；此時 body 已收完，sizes() 不需等待"""
+        try:
+            self.record_sizes(request.sizes())
+        except Exception:
+            self.requests += 1
+
+    def snapshot(self):
+        return (self.requests, self.blocked_requests, self.bytes)
+
+    def log_article(self, before, elapsed):
+        requests, blocked, size = (now - prev for now, prev in zip(self.snapshot(), before))
+        print(f"📦 精簡模式: 下載 {size / 1024:.0f} KB / {requests} 個請求，擋下 {blocked} 個請求 (未下載)，耗時 {elapsed:.2f}s")
+
+def is_blocked_request(request):
+    """判斷請求是否為內文擷取不需要的資源"""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = urlsplit(request.url).hostname or ""
+    return any(host == t or host.endswith("." + t) for t in TRACKER_HOSTS)
+
+def enable_lean_mode(page):
+    """在 page 上安裝請求路由，擋下圖片/字型/影音/樣式表與追蹤請求，回傳 TrafficStats"""
+    stats = TrafficStats()
+
+    def handle_route(route):
+        if is_blocked_request(route.request):
+            stats.blocked_requests += 1
+            route.abort()
+        else:
+            route.continue_()
+
+    page.route("**/*", handle_route)
+    page.on("requestfinished", stats.record_request)
+    return stats
+
+class PooledHTTPClient:
+    """
+    以 http.client 維持每個 host 一條 keep-alive 連線 (HTTP/1.1)，
+    連線被伺服器關閉時自動重連一次。
+    """
+
+    def __init__(self, timeout=15):
+        self.timeout = timeout
+        self._connections = {}
+
+    def _connection(self, scheme, netloc):
+        key = (scheme, netloc)
+        if key not in self._connections:
+            conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            self._connections[key] = conn_cls(netloc, timeout=self.timeout)
+        return self._connections[key]
+
+    def get(self, url, headers):
+        """回傳 (status, headers, body)；body 已處理 gzip 解壓縮"""
+        parts = urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        for attempt in range(2):
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", path or "/", headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._connections.pop((parts.scheme, parts.netloc), None)
+                if attempt:
+                    raise
+        if response.getheader("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return response.status, response, body
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+_http_client = PooledHTTPClient()
+
+def _load_json(state_path):
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_json(state_path, state):
+    if os.path.dirname(state_path):
+        os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+class ConsentState:
+    """
+    NHK 遮罩的同意狀態：每個 Context 只需穿透一次，結果與 Cookie 一併存在 STATE_PATH。
+    confirmed 決定偵測策略：已同意時內文一出現就擷取，尚未同意時還要確認頁面上沒有遮罩。
+    fast / slow 為本次執行中直接等到內文 (快速路徑) 與遇到遮罩需要穿透 (慢速路徑) 的篇數。
+    """
+
+    def __init__(self, state_path=STATE_PATH):
+        self.state_path = state_path
+        stored = _load_json(state_path).get(CONSENT_KEY) or {}
+        self.confirmed = bool(stored.get("confirmed"))
+        self.confirmed_at = stored.get("confirmed_at")
+        self.fast = 0
+        self.slow = 0
+
+    def record(self, modal_seen, bypassed=False):
+        if not modal_seen:
+            self.fast += 1
+            self.confirmed = True
+            return
+        self.slow += 1
+        self.confirmed = bypassed
+        if bypassed:
+            self.confirmed_at = time.time()
+
+    def save(self, storage_state):
+        """storage_state 為 context.storage_state() 的回傳值，與同意狀態合併後寫入 STATE_PATH"""
+        _save_json(self.state_path, {**storage_state, CONSENT_KEY: {
+            "confirmed": self.confirmed,
+            "confirmed_at": self.confirmed_at,
+        }})
+
+    def log_summary(self):
+        print(f"🚪 遮罩處理: 快速路徑 {self.fast} 篇，慢速路徑 (穿透遮罩) {self.slow} 篇")
+
+def fetch_nhk_list(state_path=LIST_STATE_PATH):
+    """
+    條件式抓取新聞清單，回傳 (DataFrame, modified)。
+    會送出上次記錄的 ETag / Last-Modified；伺服器回 304 時直接使用快取的清單 (modified=False)。
+    """
+    api_url = NHK_LIST_URL
+    state = _load_json(state_path)
+    if state.get('url') != api_url:
+        state = {}
     
     # 使用最極簡但有效的 Headers
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/121.0.0.0 Safari/537.36',
         'Accept': 'application/json',
-        'Accept-Language': 'ja-JP,ja;q=0.9'
+        'Accept-Language': 'ja-JP,ja;q=0.9',
+        'Accept-Encoding': 'gzip',
+        'Connection': 'keep-alive'
     }
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    if state.get('last_modified'):
+        headers['If-Modified-Since'] = state['last_modified']
     
     try:
-        req = urllib.request.Request(api_url, headers=headers)
-        # 這裡不使用 HTTP/2，直接走標準 HTTP/1.1 串流
-        with urllib.request.urlopen(req, timeout=15) as response:
-            if response.status == 200:
-                data = json.loads(response.read().decode('utf-8'))
-                items = data.get('channel', {}).get('item', [])
+        # 這裡不使用 HTTP/2，直接走標準 HTTP/1.1 串流 (共用 keep-alive 連線)
+        status, response, body = _http_client.get(api_url, headers)
+        if status == 304 and 'articles' in state:
+            print("📭 新聞清單未變更 (304 Not Modified)")
+            return pd.DataFrame(state['articles']), False
+        if status == 200:
+            data = json.loads(body.decode('utf-8'))
+            items = data.get('channel', {}).get('item', [])
+            
+            articles = []
+            for item in items:
+                raw_link = item.get('link', '')
+                full_id = raw_link.split('/')[-1].replace('.html', '')
+                na_url = NHK_ARTICLE_URL.format(id=full_id)
                 
-                articles = []
-                for item in items:
-                    raw_link = item.get('link', '')
-                    full_id = raw_link.split('/')[-1].replace('.html', '')
-                    na_url = f"https://news.web.nhk/newsweb/na/na-{full_id}"
-                    
-                    articles.append({
-                        'id': item.get('id'),
-                        'title': item.get('title'),
-                        'url': na_url
-                    })
-                return pd.DataFrame(articles)
-            else:
-                print(f"❌ 伺服器回傳狀態碼: {response.status}")
-                return pd.DataFrame()
+                articles.append({
+                    'id': item.get('id'),
+                    'title': item.get('title'),
+                    'url': na_url
+                })
+            _save_json(state_path, {
+                'url': api_url,
+                'etag': response.getheader('ETag'),
+                'last_modified': response.getheader('Last-Modified'),
+                'articles': articles
+            })
+            return pd.DataFrame(articles), True
+        print(f"❌ 伺服器回傳狀態碼: {status}")
+        return pd.DataFrame(), False
                 
     except Exception as e:
-        print(f"❌ urllib 抓取失敗: {e}")
-        return pd.DataFrame()
+        print(f"❌ 清單抓取失敗: {e}")
+        return pd.DataFrame(), False
+
+def fetch_nhk_news():
+    """抓取最新新聞清單 (DataFrame)；內部使用條件式請求"""
+    df, _ = fetch_nhk_list()
+    return df
 
 def setup_browser_context(p):
     """
     初始化瀏覽器與 Context，並載入儲存的狀態 (Cookies/LocalStorage)。
     """
     # 改用 headless=True 並加入反偵測參數
-    browser = p.chromium.launch(
-        headless=True,
-        args=[
-            "--headless=new",
-            "--disable-blink-features=AutomationControlled",
-            "--no-sandbox",
-            "--disable-dev-shm-usage",
-            "--disable-extensions",
-            "--disable-gpu",
-            "--disable-infobars"
-        ]
-    )
-    
-    state_path = "data/playwright_state.json"
+    browser = p.chromium.launch(headless=True, args=BROWSER_ARGS)
+    context = browser.new_context(**context_options())
+    return browser, context
+
+def context_options(state_path=STATE_PATH):
+    """sync / async 兩種模式共用的 Context 參數"""
     context_kwargs = {
         'viewport': {'width': 1920, 'height': 1080},
         'locale': 'ja-JP',
@@ -72,25 +281,26 @@ def setup_browser_context(p):
         'permissions': ['geolocation'],
         'user_agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
     }
-    if os.path.exists(state_path):
-        context_kwargs['storage_state'] = state_path
-
-    context = browser.new_context(**context_kwargs)
-    return browser, context
+    state = _load_json(state_path)
+    if state:
+        context_kwargs['storage_state'] = {key: state[key] for key in ("cookies", "origins") if key in state}
+    return context_kwargs
 
 def bypass_nhk_modals(page):
     """
-    執行點擊穿透流程 (Level 1, 2, 3)。
+    執行點擊穿透流程 (Level 1, 2, 3)，回傳是否點到第三層的確認按鈕。
+    每一步都等待下一個元素出現，不使用固定延遲。
     """
     # 1. 嘗試擊穿第 1 & 2 層
     try:
         if page.get_by_text("内容について確認しました").is_visible():
             page.get_by_text("内容について確認しました").click()
             page.get_by_role("button", name="次へ").click()
-            page.wait_for_timeout(1000)
             
-            # 處理 2/2 區域選擇
-            page.get_by_label("世帯(個人)で").check()
+            # 處理 2/2 區域選擇 (等選項出現即可操作)
+            household = page.get_by_label("世帯(個人)で")
+            household.wait_for(state="visible", timeout=MODAL_STEP_TIMEOUT)
+            household.check()
             page.locator("select").select_option(index=1)
             page.get_by_role("button", name="サービスの利用を開始する").click()
             print("✅ 擊穿前兩層導覽")
@@ -99,75 +309,120 @@ def bypass_nhk_modals(page):
         
     # 2. 擊穿第三層
     try:
-        # 使用更精確的定位方式
-        # 1) 優先使用 Role + Name
-        btn_text = page.get_by_role("button", name="確認しました / I understand")
-        # 2) 輔助使用 Class + Filter (限定包含特定內容)
-        btn_class = page.locator("button.esl7kn2s").filter(has_text="確認しました / I understand")
-        
-        target_btn = None
-        
-        # 檢查可見性 (這裡使用 count() 避免 strict mode 崩潰)
-        if btn_text.count() > 0 and btn_text.first.is_visible():
-            target_btn = btn_text.first
-        elif btn_class.count() > 0 and btn_class.first.is_visible():
-            target_btn = btn_class.first
-        else:
+        # Role + Name 與 Class + Filter 兩種定位方式，取先出現者
+        target_btn = page.get_by_role("button", name=MODAL_CONFIRM_TEXT).or_(
+            page.locator("button.esl7kn2s").filter(has_text=MODAL_CONFIRM_TEXT)
+        ).first
+        try:
+            target_btn.wait_for(state="visible", timeout=MODAL_STEP_TIMEOUT)
+        except PlaywrightTimeoutError:
             # 如果還是沒看到，嘗試捲動一次
             page.mouse.wheel(0, 1000)
-            page.wait_for_timeout(1000)
-            if btn_text.count() > 0 and btn_text.first.is_visible():
-                target_btn = btn_text.first
-            elif btn_class.count() > 0 and btn_class.first.is_visible():
-                target_btn = btn_class.first
-
-        if target_btn:
-            target_btn.scroll_into_view_if_needed()
-            target_btn.click(force=True)
-            print("✅ 成功執行點擊：確認しました / I understand")
-            page.wait_for_load_state("domcontentloaded")
-            page.wait_for_timeout(2000)
+            target_btn.wait_for(state="visible", timeout=MODAL_STEP_TIMEOUT)
+
+        target_btn.scroll_into_view_if_needed()
+        target_btn.click(force=True)
+        print(f"✅ 成功執行點擊：{MODAL_CONFIRM_TEXT}")
+        return True
     except Exception as e:
         print(f"⚠️ 處理第三層按鈕發生錯誤: {e}")
+        return False
 
-def fetch_article_full_text(url, page=None):
+def wait_for_body_or_modal(page, consent_confirmed=False):
+    """
+    只等內文或遮罩其中之一出現，回傳 True 表示不需穿透遮罩。
+    選擇器清單回傳的是 DOM 中較前面的節點，遮罩若插在內文之後，仍會先選中內文 (遮罩頁面上也有預覽段落)；
+    因此尚未記錄同意狀態時，等到內文後還要等 DOM 載入完成並確認頁面上沒有遮罩。
+    """
+    handle = page.wait_for_selector(f"{ARTICLE_BODY_SELECTOR}, {MODAL_SELECTOR}", timeout=BODY_WAIT_TIMEOUT)
+    if not handle.evaluate(MATCHES_JS, ARTICLE_BODY_SELECTOR):
+        return False
+    if consent_confirmed:
+        return True
+    page.wait_for_load_state("domcontentloaded")
+    return page.locator(MODAL_SELECTOR).count() == 0
+
+def wait_for_modal_closed(page):
+    """
+    點擊確認後等遮罩消失並等 DOM 載入完成。
+    遮罩頁面上已有以「…」結尾的預覽段落，只等內文節點會立即返回並擷取到截斷的文字。
+    """
+    page.locator(MODAL_SELECTOR).first.wait_for(state="hidden", timeout=BODY_WAIT_TIMEOUT)
+    page.wait_for_load_state("domcontentloaded")
+
+def fetch_article_full_text(url, page=None, traffic=None, trace=None, consent=None):
     """
     抓取文章全文。支援傳入既有的 page 以共用 Context。
+    快速路徑：goto 後只等內文或遮罩其中之一出現；遇到遮罩時才走慢速路徑穿透，並等遮罩消失後才擷取。
+    traffic 為 enable_lean_mode(page) 的回傳值時記錄本篇的流量與耗時。
+    trace 為 SyncMetrics.article() 的回傳值時，記錄 goto / 遮罩偵測 / 穿透 / 擷取各階段耗時。
+    trace 未指定時使用本次呼叫專用的 NullTrace。
+    consent 為 ConsentState 時依已記錄的同意狀態選擇偵測策略，並累計快速 / 慢速路徑的篇數、更新同意狀態。
     """
+    trace = trace or NullTrace()
     try:
         if page:
             # --- 使用現有的 Page (共用 Context 模式) ---
-            page.goto(url, wait_until="domcontentloaded")
+            if traffic:
+                start, before = time.perf_counter(), traffic.snapshot()
+            with trace.span("goto"):
+                page.goto(url, wait_until="commit")
             
-            # 【方案 A】直接偵測遮罩元素
-            # 使用 count() 檢查以避免 strict mode violation
-            if page.locator("button.esl7kn2s").filter(has_text="確認しました / I understand").count() > 0 or \
-               page.get_by_role("button", name="確認しました / I understand").count() > 0:
-                print(f"⚠️ 偵測到遮罩層，嘗試進行穿透...")
-                bypass_nhk_modals(page)
+            with trace.span("modal_detect") as span:
+                body_first = wait_for_body_or_modal(page, consent_confirmed=bool(consent and consent.confirmed))
+                span["path"] = "fast" if body_first else "slow"
+            bypassed = False
+            if not body_first:
+                print("⚠️ 偵測到遮罩層，嘗試進行穿透...")
+                with trace.span("modal_bypass"):
+                    bypassed = bypass_nhk_modals(page)
+                    if bypassed:
+                        wait_for_modal_closed(page)
+            if consent:
+                consent.record(not body_first, bypassed)
+            if not body_first and not bypassed:
+                # 遮罩仍在，頁面上只有預覽段落，不擷取以免存入截斷的內文
+                raise RuntimeError("無法穿透遮罩")
             
-            html_content = page.content()
+            with trace.span("extract") as span:
+                if not body_first:
+                    page.wait_for_selector(ARTICLE_BODY_SELECTOR, timeout=BODY_WAIT_TIMEOUT)
+                # browser 引擎直接在頁面內取出內文文字，其餘引擎解析 page.content()
+                if use_browser_extraction():
+                    paragraphs = extract_from_page(page)
+                else:
+                    html_content = page.content()
+                    span["bytes"] = len(html_content.encode('utf-8'))
+                    paragraphs = extract_article_paragraphs(html_content)
+            if traffic:
+                trace.bytes += traffic.snapshot()[2] - before[2]
+                traffic.log_article(before, time.perf_counter() - start)
+            else:
+                trace.bytes += span.get("bytes", 0)
+            return paragraphs
         else:
             # --- 建立臨時 Page (相容舊模式/測試用) ---
             with sync_playwright() as p:
                 browser, context = setup_browser_context(p)
                 temp_page = context.new_page()
-                temp_page.goto(url, wait_until="domcontentloaded")
+                temp_page.goto(url, wait_until="commit")
                 
-                if temp_page.locator("button.esl7kn2s").filter(has_text="確認しました / I understand").count() > 0:
-                    bypass_nhk_modals(temp_page)
+                if not wait_for_body_or_modal(temp_page):
+                    if not bypass_nhk_modals(temp_page):
+                        raise RuntimeError("無法穿透遮罩")
+                    wait_for_modal_closed(temp_page)
+                    temp_page.wait_for_selector(ARTICLE_BODY_SELECTOR, timeout=BODY_WAIT_TIMEOUT)
                 
                 html_content = temp_page.content()
                 browser.close()
             
-        soup = BeautifulSoup(html_content, 'html.parser')
-        # 抓取新版內文標籤
-        nodes = soup.find_all(['p', 'h3'], class_=['_1i1d7sh2', '_1i1d7sh9'])
-        return [n.get_text().strip() for n in nodes if n.get_text().strip()]
+            return extract_article_paragraphs(html_content)
 
     except Exception as e:
         print(f"❌ 抓取全文失敗: {e}")
+        trace.outcome = "error"
         return []
+
 # --- 測試與執行區塊 ---
 if __name__ == "__main__":
     print("📡 正在嘗試抓取 NHK 最新新聞...")
@@ -0,0 +1,97 @@
+"""
+文章內文擷取：可抽換的解析引擎。
+
+- selectolax：C 實作的 HTML 解析器 (選用套件，使用 Lexbor 後端；舊的 Modest 後端在 1.0 已移除)
+- lxml：C 實作，requirements 內建
+- bs4：原本的 BeautifulSoup html.parser 純 Python 路徑，作為最後的備援
+- 另提供 extract_from_page：直接在瀏覽器內以 querySelectorAll 取出內文文字，完全不需要解析 HTML
+
+引擎可用環境變數 NHK_EXTRACT_ENGINE 指定 (auto / selectolax / lxml / bs4 / browser)，
+auto 會依序選擇第一個可用的引擎；任何引擎失敗時都退回 bs4。
+"""
+import os
+
+ARTICLE_TAGS = ('p', 'h3')
+ARTICLE_CLASSES = ('_1i1d7sh2', '_1i1d7sh9')
+ARTICLE_BODY_SELECTOR = ", ".join(f"{tag}.{cls}" for tag in ARTICLE_TAGS for cls in ARTICLE_CLASSES)
+
+EXTRACT_ENGINE = os.getenv("NHK_EXTRACT_ENGINE", "auto")
+
+# 在瀏覽器內執行：依文件順序回傳每個內文節點的 textContent
+BROWSER_EXTRACT_JS = "nodes => nodes.map(n => n.textContent)"
+
+def _clean(texts):
+    """與原本的 get_text().strip() 相同：去除首尾空白並丟掉空段落"""
+    return [t.strip() for t in texts if t and t.strip()]
+
+def extract_bs4(html_content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
+    # 抓取新版內文標籤
+    nodes = soup.find_all(list(ARTICLE_TAGS), class_=list(ARTICLE_CLASSES))
+    return _clean(n.get_text() for n in nodes)
+
+# class 屬性可能含多個值，以空白包夾後比對
+_LXML_XPATH = " | ".join(
+    f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]"
+    for tag in ARTICLE_TAGS for cls in ARTICLE_CLASSES
+)
+
+def extract_lxml(html_content):
+    import lxml.html
+    tree = lxml.html.fromstring(html_content)
+    # XPath 聯集 (|) 的結果依文件順序排列
+    return _clean(node.text_content() for node in tree.xpath(_LXML_XPATH))
+
+def extract_selectolax(html_content):
+    from selectolax.lexbor import LexborHTMLParser
+    tree = LexborHTMLParser(html_content)
+    return _clean(node.text(deep=True) for node in tree.css(ARTICLE_BODY_SELECTOR))
+
+ENGINES = {
+    'selectolax': extract_selectolax,
+    'lxml': extract_lxml,
+    'bs4': extract_bs4,
+}
+
+def available_engines():
+    """回傳目前環境中可用的 HTML 解析引擎名稱 (依優先順序)"""
+    engines = []
+    for name, module in (('selectolax', 'selectolax.lexbor'), ('lxml', 'lxml.html'), ('bs4', 'bs4')):
+        try:
+            __import__(module)
+            engines.append(name)
+        except ImportError:
+            pass
+    return engines
+
+_auto_engine = None
+
+def _resolve_engine(engine):
+    global _auto_engine
+    if engine not in (None, 'auto', 'browser'):
+        return engine
+    if _auto_engine is None:
+        _auto_engine = (available_engines() or ['bs4'])[0]
+    return _auto_engine
+
+def extract_article_paragraphs(html_content, engine=None):
+    """從文章頁 HTML 擷取內文段落；指定引擎失敗時退回 BeautifulSoup"""
+    name = _resolve_engine(engine or EXTRACT_ENGINE)
+    if name != 'bs4':
+        try:
+            return ENGINES[name](html_content)
+        except Exception as e:
+            print(f"⚠️ {name} 擷取失敗，改用 BeautifulSoup: {e}")
+    return extract_bs4(html_content)
+
+def use_browser_extraction(engine=None):
+    return (engine or EXTRACT_ENGINE) == 'browser'
+
+def extract_from_page(page):
+    """在瀏覽器內直接取出內文節點文字 (sync Page)"""
+    return _clean(page.eval_on_selector_all(ARTICLE_BODY_SELECTOR, BROWSER_EXTRACT_JS))
+
+async def extract_from_page_async(page):
+    """extract_from_page 的 async 版本"""
+    return _clean(await page.eval_on_selector_all(ARTICLE_BODY_SELECTOR, BROWSER_EXTRACT_JS))
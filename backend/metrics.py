@@ -0,0 +1,193 @@
+"""
+同步流程的階段計時與指標輸出。
+
+- SyncMetrics.span(stage) 記錄一個階段的耗時、結果 (ok / error) 與位元組數
+- SyncMetrics.article(aid, url) 回傳 ArticleTrace，同一篇文章的各階段都會帶上文章 ID，
+  並在結束時記錄該篇的結果 (ok / empty / error / timeout)、段落數與下載位元組數
+- 未啟用指標時每篇文章改用一個 NullTrace (介面相同，但不記錄任何東西)
+- write_jsonl() 輸出 JSON lines 執行記錄 (每個階段、每篇文章各一行，最後一行為整體摘要)
+- write_prometheus() 輸出 Prometheus text format 摘要，可交給 node_exporter textfile collector 或直接比對
+
+階段名稱: list_fetch, browser_launch, goto, modal_detect, modal_bypass, extract, analysis, db_write
+"""
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+STAGES = ("list_fetch", "browser_launch", "goto", "modal_detect", "modal_bypass", "extract", "analysis", "db_write")
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class SyncMetrics:
+    """單次同步的計時記錄"""
+
+    def __init__(self):
+        self.run_id = time.strftime("%Y%m%dT%H%M%S")
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.articles = []
+
+    def _elapsed(self):
+        return time.perf_counter() - self._t0
+
+    @contextmanager
+    def span(self, stage, article=None, **fields):
+        """
+        以 with 區塊計時一個階段；yield 出的 dict 可在區塊內補上 bytes 等欄位。
+        區塊內發生例外時記錄 outcome="error" 後照常往外拋。
+        """
+        record = {"stage": stage, "article": article, "outcome": "ok", **fields}
+        start = self._elapsed()
+        try:
+            yield record
+        except BaseException as e:
+            record["outcome"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["start_s"] = round(start, 4)
+            record["duration_s"] = round(self._elapsed() - start, 4)
+            self.spans.append(record)
+
+    def article(self, aid, url=None):
+        return ArticleTrace(self, aid, url)
+
+    def stage_durations(self):
+        durations = {}
+        for span in self.spans:
+            durations.setdefault(span["stage"], []).append(span["duration_s"])
+        return durations
+
+    def modal_paths(self):
+        """modal_detect 階段走快速路徑 (直接等到內文) 與慢速路徑 (遇到遮罩) 的次數"""
+        paths = {}
+        for span in self.spans:
+            if span["stage"] == "modal_detect" and "path" in span:
+                paths[span["path"]] = paths.get(span["path"], 0) + 1
+        return paths
+
+    def summary(self):
+        outcomes = {}
+        for article in self.articles:
+            outcomes[article["outcome"]] = outcomes.get(article["outcome"], 0) + 1
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "duration_s": round(self._elapsed(), 4),
+            "articles": outcomes,
+            "bytes": sum(a["bytes"] for a in self.articles),
+            "modal_paths": self.modal_paths(),
+            "stages": {stage: round(sum(values), 4) for stage, values in self.stage_durations().items()},
+        }
+
+    def write_jsonl(self, path):
+        """依時間順序寫出各階段與文章記錄，最後一行為整體摘要"""
+        _ensure_dir(path)
+        with open(path, 'w', encoding='utf-8') as f:
+            for span in sorted(self.spans, key=lambda s: s["start_s"]):
+                f.write(json.dumps({"type": "span", "run_id": self.run_id, **span}, ensure_ascii=False) + "\n")
+            for article in self.articles:
+                f.write(json.dumps({"type": "article", "run_id": self.run_id, **article}, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"type": "run", **self.summary()}, ensure_ascii=False) + "\n")
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP nhk_sync_stage_seconds Duration of each sync pipeline stage.",
+            "# TYPE nhk_sync_stage_seconds summary",
+        ]
+        durations = self.stage_durations()
+        for stage in [s for s in STAGES if s in durations] + [s for s in durations if s not in STAGES]:
+            values = sorted(durations[stage])
+            for q in QUANTILES:
+                lines.append(f'nhk_sync_stage_seconds{{stage="{stage}",quantile="{q}"}} {_quantile(values, q):.6f}')
+            lines.append(f'nhk_sync_stage_seconds_sum{{stage="{stage}"}} {sum(values):.6f}')
+            lines.append(f'nhk_sync_stage_seconds_count{{stage="{stage}"}} {len(values)}')
+
+        errors = {}
+        for span in self.spans:
+            if span["outcome"] == "error":
+                errors[span["stage"]] = errors.get(span["stage"], 0) + 1
+        lines += ["# HELP nhk_sync_stage_errors_total Stage executions that raised.",
+                  "# TYPE nhk_sync_stage_errors_total counter"]
+        lines += [f'nhk_sync_stage_errors_total{{stage="{stage}"}} {n}' for stage, n in sorted(errors.items())]
+
+        summary = self.summary()
+        lines += ["# HELP nhk_sync_articles_total Articles fetched in this run by outcome.",
+                  "# TYPE nhk_sync_articles_total counter"]
+        lines += [f'nhk_sync_articles_total{{outcome="{outcome}"}} {n}' for outcome, n in sorted(summary["articles"].items())]
+        lines += ["# HELP nhk_sync_modal_path_total Articles that reached the body directly (fast) or hit the consent modal (slow).",
+                  "# TYPE nhk_sync_modal_path_total counter"]
+        lines += [f'nhk_sync_modal_path_total{{path="{path}"}} {n}' for path, n in sorted(summary["modal_paths"].items())]
+        lines += [
+            "# HELP nhk_sync_article_bytes_total Bytes downloaded for article pages.",
+            "# TYPE nhk_sync_article_bytes_total counter",
+            f"nhk_sync_article_bytes_total {summary['bytes']}",
+            "# HELP nhk_sync_run_duration_seconds Wall time of the whole sync run.",
+            "# TYPE nhk_sync_run_duration_seconds gauge",
+            f"nhk_sync_run_duration_seconds {summary['duration_s']:.6f}",
+            "# HELP nhk_sync_last_run_timestamp_seconds Unix time the run started.",
+            "# TYPE nhk_sync_last_run_timestamp_seconds gauge",
+            f"nhk_sync_last_run_timestamp_seconds {self.started_at:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _ensure_dir(path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+class ArticleTrace:
+    """單篇文章的計時：各階段自動帶上文章 ID，finish() 時寫入文章記錄"""
+
+    def __init__(self, metrics, aid, url=None):
+        self.metrics = metrics
+        self.aid = aid
+        self.url = url
+        self.outcome = None
+        self.bytes = 0
+        self._start = metrics._elapsed()
+
+    def span(self, stage, **fields):
+        return self.metrics.span(stage, article=self.aid, **fields)
+
+    def finish(self, paragraphs=None, outcome=None):
+        """記錄本篇結果；未指定 outcome 時依是否取得段落判斷 ok / empty"""
+        outcome = outcome or self.outcome or ("ok" if paragraphs else "empty")
+        self.metrics.articles.append({
+            "article": self.aid,
+            "url": self.url,
+            "outcome": outcome,
+            "paragraphs": len(paragraphs or []),
+            "bytes": self.bytes,
+            "duration_s": round(self.metrics._elapsed() - self._start, 4),
+        })
+
+
+class NullTrace:
+    """未啟用指標時使用的空記錄：span 只是空的 with 區塊，finish 不寫入任何記錄 (每篇文章各建一個)"""
+
+    def __init__(self):
+        self.outcome = None
+        self.bytes = 0
+
+    def span(self, stage, **fields):
+        return nullcontext(dict(fields))
+
+    def finish(self, paragraphs=None, outcome=None):
+        pass
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def _ensure_dir(path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -0,0 +1,466 @@
+"""
+文章資料庫 (SQLite)：取代每次整檔重寫的 news_db.json。
+
+- articles 表以文章 ID 為主鍵，並對 timestamp 建立索引
+- 寫入皆在交易中完成 (WAL 模式)，同步中途中斷不會留下半個檔案
+- 保留筆數/天數由 RetentionPolicy 設定，不再寫死 15 則
+- 首次開啟空資料庫時可從舊的 news_db.json 一次性匯入
+- postings 表為 lemma -> (文章 ID, 位置) 的倒排索引，寫入文章時同步更新，
+  文章被淘汰時透過外鍵 ON DELETE CASCADE 一併刪除；articles.postings_version 記錄文章已以哪一版建立索引
+- daily_stats / lemma_stats 為語料層級的每日統計，寫入與淘汰文章時在同一交易中
+  以增減量 (delta) 更新，儀表板讀取時只需掃過天數筆資料
+- lemma_stats 另存單字的級別代碼 (由 set_vocab 指定的字彙表決定，字彙版本改變時重設)，
+  高頻單字查詢可直接在 SQL 中依級別篩選並取前 N 個
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.analyzer import LEVEL_ORDER
+
+LEVEL_COLUMNS = [lv.lower() for lv in LEVEL_ORDER]
+# 倒排索引格式版本：改變 postings 的內容或格式時遞增，rebuild_index 會重建舊版本的文章
+POSTINGS_VERSION = 1
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS articles (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    url TEXT,
+    timestamp REAL NOT NULL,
+    content TEXT NOT NULL,
+    analysis TEXT,
+    analysis_stamp TEXT,
+    postings_version INTEGER,
+    {", ".join(f"{col} INTEGER NOT NULL DEFAULT 0" for col in LEVEL_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_articles_timestamp ON articles (timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_articles_stamp ON articles (analysis_stamp);
+{"".join(f"CREATE INDEX IF NOT EXISTS idx_articles_{col} ON articles ({col});" + chr(10) for col in LEVEL_COLUMNS)}
+CREATE TABLE IF NOT EXISTS postings (
+    lemma TEXT NOT NULL,
+    article_id TEXT NOT NULL REFERENCES articles (id) ON DELETE CASCADE,
+    tf INTEGER NOT NULL,
+    positions TEXT NOT NULL,
+    PRIMARY KEY (lemma, article_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_article ON postings (article_id);
+CREATE TABLE IF NOT EXISTS daily_stats (
+    day TEXT PRIMARY KEY,
+    articles INTEGER NOT NULL,
+    {", ".join(f"{col} INTEGER NOT NULL" for col in LEVEL_COLUMNS)},
+    lemmas INTEGER NOT NULL,
+    matched INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lemma_stats (
+    day TEXT NOT NULL,
+    lemma TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    level INTEGER,
+    PRIMARY KEY (day, lemma)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stats_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 統計以日本時間分日 (NHK 新聞的發布時區)，與執行同步的機器時區無關
+STATS_TZ_OFFSET = 9 * 3600
+DAILY_COLUMNS = ["articles", *LEVEL_COLUMNS, "lemmas", "matched"]
+# lemma_stats.level: 0=N1 ... 4=N5；不在字彙表中為 -1，NULL 表示寫入時尚未指定字彙表
+NO_LEVEL = -1
+
+
+def stats_day(timestamp):
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp + STATS_TZ_OFFSET))
+
+
+class RetentionPolicy:
+    """保留規則：最多 max_articles 則、且不超過 max_age_days 天 (None 表示不限制)"""
+
+    def __init__(self, max_articles=None, max_age_days=None):
+        self.max_articles = max_articles
+        self.max_age_days = max_age_days
+
+    @classmethod
+    def from_env(cls):
+        max_articles = os.getenv("NHK_MAX_ARTICLES", "15")
+        max_age_days = os.getenv("NHK_MAX_AGE_DAYS")
+        return cls(
+            max_articles=int(max_articles) if max_articles else None,
+            max_age_days=float(max_age_days) if max_age_days else None,
+        )
+
+
+def analysis_stamp(analysis):
+    """分析結果的完整版本戳記 (斷詞設定 + 字彙版本)，用來以索引找出過期的文章"""
+    if not analysis:
+        return None
+    return f"{analysis.get('tokenizer')}|{analysis.get('vocab')}"
+
+
+class ArticleStore:
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Streamlit 會在不同執行緒間共用同一個 store，以鎖保護連線
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._level_code = None
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            # 舊資料庫的 lemma_stats 沒有 level 欄位：補上後由 set_vocab 填入
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(lemma_stats)")}
+            if "level" not in columns:
+                self._conn.execute("ALTER TABLE lemma_stats ADD COLUMN level INTEGER")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lemma_stats_level ON lemma_stats (level, day)")
+            # 舊資料庫的 articles 沒有 postings_version 欄位：已有 postings 的文章視為已建立索引
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(articles)")}
+            if "postings_version" not in columns:
+                with self._conn:
+                    self._conn.execute("ALTER TABLE articles ADD COLUMN postings_version INTEGER")
+                    self._conn.execute(
+                        "UPDATE articles SET postings_version = ? "
+                        "WHERE EXISTS (SELECT 1 FROM postings WHERE article_id = articles.id)",
+                        (POSTINGS_VERSION,),
+                    )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_postings ON articles (postings_version)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def existing_ids(self, ids):
+        """回傳 ids 中已存在於資料庫的文章 ID (只查詢主鍵索引)"""
+        ids = [str(i) for i in ids]
+        if not ids:
+            return set()
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id FROM articles WHERE id IN ({placeholders})", ids).fetchall()
+        return {row["id"] for row in rows}
+
+    def set_vocab(self, index):
+        """
+        指定 lemma_stats 級別欄位所用的字彙表 (VocabIndex)。
+        字彙版本與上次不同時重設所有列的級別，否則只補上尚未分類的列。
+        """
+        self._level_code = index.level_code
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM stats_meta WHERE key = 'vocab_version'").fetchone()
+            sql = "SELECT day, lemma FROM lemma_stats"
+            if row is not None and row["value"] == index.version:
+                sql += " WHERE level IS NULL"
+            rows = self._conn.execute(sql).fetchall()
+            self._conn.executemany(
+                "UPDATE lemma_stats SET level = ? WHERE day = ? AND lemma = ?",
+                [(self._level_of(row["lemma"]), row["day"], row["lemma"]) for row in rows],
+            )
+            self._conn.execute(
+                "INSERT INTO stats_meta (key, value) VALUES ('vocab_version', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (index.version,),
+            )
+        return len(rows)
+
+    def _level_of(self, word):
+        """單字的級別代碼；尚未指定字彙表時回傳 None (之後由 set_vocab 補上)"""
+        if self._level_code is None:
+            return None
+        code = self._level_code(word)
+        return NO_LEVEL if code is None else code
+
+    def upsert_many(self, records):
+        """records: {aid: {title, url, content, timestamp, analysis?}}，於單一交易中寫入"""
+        rows = []
+        for aid, record in records.items():
+            analysis = record.get("analysis")
+            levels = (analysis or {}).get("levels", {})
+            rows.append((
+                str(aid), record["title"], record.get("url"), record["timestamp"],
+                json.dumps(record.get("content") or [], ensure_ascii=False),
+                json.dumps(analysis, ensure_ascii=False) if analysis else None,
+                analysis_stamp(analysis),
+                POSTINGS_VERSION if analysis else None,
+                *(int(levels.get(lv, 0)) for lv in LEVEL_ORDER),
+            ))
+        columns = ["id", "title", "url", "timestamp", "content", "analysis", "analysis_stamp", "postings_version",
+                   *LEVEL_COLUMNS]
+        updates = ", ".join(f"{col}=excluded.{col}" for col in columns[1:])
+        with self._lock, self._conn:
+            # 先扣掉被覆寫文章的舊統計，再加上新內容的統計
+            old = [self._stats_source(str(aid)) for aid in records]
+            self._apply_stats([row for row in old if row], sign=-1)
+            self._apply_stats([(record["timestamp"], record.get("analysis")) for record in records.values()], sign=1)
+            self._conn.executemany(
+                f"INSERT INTO articles ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                rows,
+            )
+            for aid, record in records.items():
+                self._index_article(str(aid), (record.get("analysis") or {}).get("lemmas"))
+
+    def _index_article(self, aid, lemmas):
+        """更新單篇文章的倒排索引 (呼叫端需持有鎖並在交易中)"""
+        self._conn.execute("DELETE FROM postings WHERE article_id = ?", (aid,))
+        if not lemmas:
+            return
+        positions = {}
+        for pos, lemma in enumerate(lemmas):
+            positions.setdefault(lemma, []).append(pos)
+        self._conn.executemany(
+            "INSERT INTO postings (lemma, article_id, tf, positions) VALUES (?, ?, ?, ?)",
+            [(lemma, aid, len(pos_list), json.dumps(pos_list)) for lemma, pos_list in positions.items()],
+        )
+
+    def _stats_source(self, aid):
+        """讀取文章目前的 (timestamp, analysis)，供扣除統計用；不存在時回傳 None"""
+        row = self._conn.execute("SELECT timestamp, analysis FROM articles WHERE id = ?", (aid,)).fetchone()
+        if row is None:
+            return None
+        return row["timestamp"], json.loads(row["analysis"]) if row["analysis"] else None
+
+    def _apply_stats(self, sources, sign):
+        """
+        將多篇文章 (timestamp, analysis) 的統計以 sign (+1 / -1) 累加到每日統計表
+        (呼叫端需持有鎖並在交易中)。計數歸零的列會被刪除。
+        """
+        daily, lemmas = {}, {}
+        for timestamp, analysis in sources:
+            day = stats_day(timestamp)
+            analysis = analysis or {}
+            levels = analysis.get("levels", {})
+            tokens = analysis.get("tokens", {})
+            delta = [1, *(int(levels.get(lv, 0)) for lv in LEVEL_ORDER),
+                     len(analysis.get("lemmas", [])), sum(tokens.values())]
+            daily[day] = [a + b for a, b in zip(daily.get(day, [0] * len(DAILY_COLUMNS)), delta)]
+            for word, count in tokens.items():
+                lemmas[(day, word)] = lemmas.get((day, word), 0) + count
+        if not daily:
+            return
+
+        updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in DAILY_COLUMNS)
+        self._conn.executemany(
+            f"INSERT INTO daily_stats (day, {', '.join(DAILY_COLUMNS)}) VALUES ({', '.join('?' * (len(DAILY_COLUMNS) + 1))}) "
+            f"ON CONFLICT(day) DO UPDATE SET {updates}",
+            [(day, *(sign * v for v in values)) for day, values in daily.items()],
+        )
+        self._conn.executemany(
+            "INSERT INTO lemma_stats (day, lemma, count, level) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(day, lemma) DO UPDATE SET count = count + excluded.count, "
+            "level = COALESCE(excluded.level, lemma_stats.level)",
+            [(day, word, sign * count, self._level_of(word)) for (day, word), count in lemmas.items()],
+        )
+        if sign < 0:
+            self._conn.execute("DELETE FROM daily_stats WHERE articles <= 0")
+            self._conn.execute("DELETE FROM lemma_stats WHERE count <= 0")
+
+    def rebuild_stats(self):
+        """由全部文章重新計算每日統計 (僅在統計表為空、例如舊資料庫升級時使用)，回傳處理筆數"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM daily_stats")
+            self._conn.execute("DELETE FROM lemma_stats")
+            count = 0
+            for row in self._conn.execute("SELECT timestamp, analysis FROM articles"):
+                analysis = json.loads(row["analysis"]) if row["analysis"] else None
+                self._apply_stats([(row["timestamp"], analysis)], sign=1)
+                count += 1
+        return count
+
+    def daily_stats(self, days=None):
+        """依日期舊到新回傳每日統計 (最近 days 天)，每列含文章數、各級別單字數、lemma 數與命中次數"""
+        sql = f"SELECT day, {', '.join(DAILY_COLUMNS)} FROM daily_stats"
+        params = ()
+        if days:
+            sql += " WHERE day >= ?"
+            params = (stats_day(time.time() - (days - 1) * 86400),)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql + " ORDER BY day", params)]
+
+    def top_lemmas(self, days=7, limit=None, level=None):
+        """
+        最近 days 天出現次數最多的字彙，回傳 [(word, 次數)]。
+        level 為可選的級別 (例如 "N1")，依 lemma_stats 的級別欄位篩選；需先以 set_vocab 指定字彙表。
+        """
+        sql = "SELECT lemma, SUM(count) AS total FROM lemma_stats WHERE day >= ?"
+        params = [stats_day(time.time() - (days - 1) * 86400)]
+        if level is not None:
+            if level not in LEVEL_ORDER:
+                raise ValueError(f"未知的級別: {level}")
+            sql += " AND level = ?"
+            params.append(LEVEL_ORDER.index(level))
+        sql += " GROUP BY lemma ORDER BY total DESC, lemma"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [(row["lemma"], row["total"]) for row in self._conn.execute(sql, params)]
+
+    def rebuild_index(self):
+        """
+        為尚未以目前 POSTINGS_VERSION 建立倒排索引的文章補建索引 (由儲存的 lemmas 建立，不需重新斷詞)，回傳處理筆數。
+        建立後記錄 postings_version，lemmas 為空的文章也只會處理一次。
+        """
+        with self._lock:
+            ids = [row["id"] for row in self._conn.execute(
+                "SELECT id FROM articles WHERE analysis IS NOT NULL "
+                "AND (postings_version IS NULL OR postings_version != ?)",
+                (POSTINGS_VERSION,),
+            )]
+        for aid in ids:
+            record = self.get(aid)
+            with self._lock, self._conn:
+                self._index_article(aid, record["analysis"].get("lemmas"))
+                self._conn.execute("UPDATE articles SET postings_version = ? WHERE id = ?", (POSTINGS_VERSION, aid))
+        return len(ids)
+
+    def search_lemmas(self, lemmas, limit=50):
+        """
+        查詢包含 lemma 序列的文章，回傳依出現次數、時間排序的摘要列表。
+        多個 lemma 時視為片語：必須在同一篇文章中連續出現。
+        """
+        lemmas = [lemma for lemma in lemmas if lemma]
+        if not lemmas:
+            return []
+        placeholders = ",".join("?" * len(lemmas))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT article_id, lemma, positions FROM postings WHERE lemma IN ({placeholders}) "
+                f"AND article_id IN (SELECT article_id FROM postings WHERE lemma IN ({placeholders}) "
+                f"GROUP BY article_id HAVING COUNT(*) = ?)",
+                [*lemmas, *lemmas, len(set(lemmas))],
+            ).fetchall()
+
+        postings = {}
+        for row in rows:
+            postings.setdefault(row["article_id"], {})[row["lemma"]] = json.loads(row["positions"])
+        hits = {}
+        for aid, by_lemma in postings.items():
+            starts = set(by_lemma[lemmas[0]])
+            for offset, lemma in enumerate(lemmas[1:], start=1):
+                starts &= {p - offset for p in by_lemma[lemma]}
+            if starts:
+                hits[aid] = len(starts)
+        if not hits:
+            return []
+
+        placeholders = ",".join("?" * len(hits))
+        with self._lock:
+            meta = {row["id"]: dict(row) for row in self._conn.execute(
+                f"SELECT id, title, timestamp FROM articles WHERE id IN ({placeholders})", list(hits)
+            )}
+        results = [{**meta[aid], "count": count} for aid, count in hits.items() if aid in meta]
+        results.sort(key=lambda r: (r["count"], r["timestamp"]), reverse=True)
+        return results[:limit]
+
+    def articles_with_min_level(self, level, min_count, limit=None):
+        """查詢某級別不重複單字數至少 min_count 的文章 (使用級別欄位索引)"""
+        col = level.lower()
+        if col not in LEVEL_COLUMNS:
+            raise ValueError(f"未知的級別: {level}")
+        sql = f"SELECT id, title, timestamp, {col} AS count FROM articles WHERE {col} >= ? ORDER BY {col} DESC, timestamp DESC"
+        params = [min_count]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def get(self, aid):
+        """讀取單篇文章完整內容，不存在時回傳 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM articles WHERE id = ?", (str(aid),)).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def list_articles(self, limit=None):
+        """依時間新到舊列出文章摘要 (不含內文)，供側邊欄清單使用"""
+        sql = f"SELECT id, title, url, timestamp, {', '.join(LEVEL_COLUMNS)} FROM articles ORDER BY timestamp DESC"
+        params = ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def has_stale(self, stamp):
+        """是否有分析戳記與 stamp 不符的文章 (只查詢戳記索引)"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM articles WHERE analysis_stamp IS NULL OR analysis_stamp != ? LIMIT 1", (stamp,)
+            ).fetchone() is not None
+
+    def iter_stale(self, stamp):
+        """逐筆產生分析戳記與 stamp 不符的文章 (id, record)"""
+        with self._lock:
+            ids = [row["id"] for row in self._conn.execute(
+                "SELECT id FROM articles WHERE analysis_stamp IS NULL OR analysis_stamp != ?", (stamp,)
+            )]
+        for aid in ids:
+            record = self.get(aid)
+            if record:
+                yield aid, record
+
+    def apply_retention(self, policy):
+        """依保留規則刪除過舊的文章，回傳被刪除的文章 ID"""
+        conditions, params = [], []
+        if policy.max_age_days is not None:
+            conditions.append("timestamp < ?")
+            params.append(time.time() - policy.max_age_days * 86400)
+        if policy.max_articles is not None:
+            conditions.append("id NOT IN (SELECT id FROM articles ORDER BY timestamp DESC LIMIT ?)")
+            params.append(policy.max_articles)
+        if not conditions:
+            return []
+        where = " OR ".join(conditions)
+        with self._lock, self._conn:
+            # 刪除前先讀出分析結果，從每日統計中扣除
+            rows = self._conn.execute(f"SELECT id, timestamp, analysis FROM articles WHERE {where}", params).fetchall()
+            evicted = [row["id"] for row in rows]
+            self._apply_stats(
+                [(row["timestamp"], json.loads(row["analysis"]) if row["analysis"] else None) for row in rows], sign=-1
+            )
+            self._conn.execute(f"DELETE FROM articles WHERE {where}", params)
+        return evicted
+
+    def import_json(self, json_path):
+        """一次性匯入舊版 news_db.json，回傳匯入筆數"""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            db = json.load(f)
+        self.upsert_many(db)
+        return len(db)
+
+    @staticmethod
+    def _row_to_record(row):
+        record = dict(row)
+        record["content"] = json.loads(record["content"])
+        record["analysis"] = json.loads(record["analysis"]) if record["analysis"] else None
+        return record
+
+
+def open_store(path, legacy_json=None):
+    """開啟資料庫；若為空且存在舊版 JSON 檔則自動匯入，並補建缺少的倒排索引與每日統計"""
+    store = ArticleStore(path)
+    if legacy_json and store.count() == 0 and os.path.exists(legacy_json):
+        try:
+            imported = store.import_json(legacy_json)
+            print(f"📥 已從 {legacy_json} 匯入 {imported} 則文章")
+        except Exception as e:
+            print(f"❌ 匯入舊版資料庫失敗: {e}")
+    indexed = store.rebuild_index()
+    if indexed:
+        print(f"🗂️ 已為 {indexed} 則文章補建倒排索引")
+    if store.count() and not store.daily_stats():
+        print(f"📈 已由 {store.rebuild_stats()} 則文章重建每日統計")
+    return store
@@ -0,0 +1,77 @@
+"""
+analyze_jlpt_level 微基準測試：比較舊的 pandas isin/value_counts、單 token 查表
+與多 token 比對器 (app/matcher.py)。
+
+用法:
+    python -m benchmarks.bench_analyzer [--vocab JLPTWords.csv] [--repeat 20]
+
+預設使用 benchmarks/fixtures/ 內的字彙表與資料庫，不需要連線。
+"""
+import argparse
+import json
+import time
+
+from app.analyzer import LEVEL_ORDER, VocabIndex, count_levels, get_matcher, tokenize_lemmas
+from app.matcher import LemmaMatcher
+from app.vocab import load_vocab_df
+from benchmarks.suite import NEWS_DB_FIXTURE, VOCAB_FIXTURE
+
+
+def legacy_counts(tokens, vocab_df):
+    """原本的實作：每次呼叫都掃描整個 vocab_df"""
+    match_df = vocab_df[vocab_df['word'].isin(tokens)]
+    return match_df['level'].value_counts().reindex(LEVEL_ORDER, fill_value=0)
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vocab', default=VOCAB_FIXTURE)
+    parser.add_argument('--db', default=NEWS_DB_FIXTURE)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    vocab_df = load_vocab_df(args.vocab)
+    with open(args.db, 'r', encoding='utf-8') as f:
+        articles = json.load(f)
+
+    # 斷詞兩條路徑共用，只比較比對階段
+    token_lists = [tokenize_lemmas("".join(a.get('content') or [])) for a in articles.values()]
+
+    build_time = _best_of(lambda: VocabIndex.from_dataframe(vocab_df), 3)
+    index = VocabIndex.from_dataframe(vocab_df)
+    matcher_start = time.perf_counter()
+    matcher = get_matcher(index)
+    matcher_time = time.perf_counter() - matcher_start
+    # 只含單 token 模式的比對器，結果應與舊實作完全相同
+    single = LemmaMatcher({(word,): word for word, _ in index.items()})
+
+    extra = 0
+    for tokens in token_lists:
+        old = legacy_counts(tokens, vocab_df)
+        new, _ = count_levels(tokens, index, single)
+        assert old.tolist() == new.tolist(), (old.tolist(), new.tolist())
+        extra += int(count_levels(tokens, index, matcher)[0].sum() - new.sum())
+
+    old_time = _best_of(lambda: [legacy_counts(t, vocab_df) for t in token_lists], args.repeat)
+    new_time = _best_of(lambda: [count_levels(t, index, single) for t in token_lists], args.repeat)
+    multi_time = _best_of(lambda: [count_levels(t, index, matcher) for t in token_lists], args.repeat)
+
+    n = len(token_lists)
+    print(f"📚 字彙數: {len(vocab_df)}  📰 文章數: {n}  🔤 token 總數: {sum(map(len, token_lists))}")
+    print(f"🏗️  建立索引 (一次性): {build_time * 1000:.2f} ms，編譯多 token 比對器: {matcher_time * 1000:.0f} ms")
+    print(f"🐢 isin/value_counts: {old_time / n * 1000:.3f} ms/篇")
+    print(f"⚡ 單 token 查表:     {new_time / n * 1000:.3f} ms/篇  (x{old_time / new_time:.1f})")
+    print(f"🔗 多 token 比對:     {multi_time / n * 1000:.3f} ms/篇  (淨增 {extra:+d} 個字彙)")
+
+
+if __name__ == "__main__":
+    main()
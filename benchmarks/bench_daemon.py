@@ -0,0 +1,133 @@
+"""
+分析常駐服務 (app/daemon.py) 的負載測試。
+
+以多個並行用戶端 (各自一條 Unix socket 連線) 反覆送出分析請求，
+回報整體吞吐量與每個請求延遲的 p50 / p99。文字取自 benchmarks/fixtures/html/*.json 的文章內文。
+
+用法:
+    python -m benchmarks.bench_daemon                      # 自動啟動一個常駐服務子行程
+    python -m benchmarks.bench_daemon --socket data/analyzer.sock --clients 64 --requests 200
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from app.daemon import AnalysisClient
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+
+def load_texts():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append("".join(json.load(f)))
+    return texts
+
+
+def start_daemon(socket_path, vocab, timeout=120.0):
+    cmd = [sys.executable, "-m", "app.daemon", "--socket", socket_path]
+    if vocab:
+        cmd += ["--vocab", vocab]
+    proc = subprocess.Popen(cmd)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(socket_path):
+        if proc.poll() is not None or time.monotonic() > deadline:
+            proc.kill()
+            raise RuntimeError("分析服務啟動失敗")
+        time.sleep(0.1)
+    return proc
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def run_load(socket_path, texts, clients, requests, batch):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def worker(worker_id):
+        client = AnalysisClient(socket_path)
+        local = []
+        try:
+            barrier.wait()
+            for i in range(requests):
+                payload = [texts[(worker_id + i + j) % len(texts)] for j in range(batch)]
+                start = time.perf_counter()
+                client.analyze_many(payload)
+                local.append(time.perf_counter() - start)
+        except Exception as e:
+            with lock:
+                errors.append(e)
+        finally:
+            client.close()
+            with lock:
+                latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "texts_per_request": batch,
+        "elapsed_s": elapsed,
+        "requests_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--socket', help="已啟動的分析服務 socket (未指定時自動啟動一個)")
+    parser.add_argument('--vocab', help="自動啟動服務時使用的字彙快照檔")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=50, help="每個用戶端送出的請求數")
+    parser.add_argument('--batch', type=int, default=1, help="每個請求包含的文章數")
+    parser.add_argument('--json', action='store_true', help="以 JSON lines 輸出結果")
+    args = parser.parse_args()
+
+    texts = load_texts()
+    proc = None
+    socket_path = args.socket
+    if not socket_path:
+        socket_path = os.path.join(tempfile.mkdtemp(), "analyzer.sock")
+        proc = start_daemon(socket_path, args.vocab)
+    try:
+        # 暖身：確認服務可用並排除第一次請求的延遲
+        AnalysisClient(socket_path).analyze_many(texts)
+        for clients in args.clients:
+            result = run_load(socket_path, texts, clients, args.requests, args.batch)
+            if args.json:
+                print(json.dumps(result))
+            else:
+                print(f"⏱️ {clients:>4} 個用戶端: {result['requests_per_s']:8.1f} req/s   "
+                      f"p50 {result['p50_ms']:7.2f} ms   p99 {result['p99_ms']:7.2f} ms   錯誤 {result['errors']}")
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
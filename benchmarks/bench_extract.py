@@ -0,0 +1,128 @@
+"""
+內文擷取引擎基準測試與 golden-file 比對。
+
+對 benchmarks/fixtures/html/*.html 的每個檔案，確認各引擎輸出與同名 .json 完全相同，
+再比較每個引擎的解析時間與峰值記憶體。每個引擎在獨立子行程中量測：
+- 峰值 RSS：子行程的 ru_maxrss 減去只載入 fixtures、不解析的基準子行程 (C 實作的解析器配置的記憶體也會計入)
+- Python 配置峰值：解析迴圈期間 tracemalloc 記錄的峰值 (不含 C 函式庫自行配置的記憶體)
+未安裝的選用引擎 (例如 selectolax) 會列出並略過。
+
+用法:
+    python -m benchmarks.bench_extract            # 比對 + 基準測試
+    python -m benchmarks.bench_extract --check    # 只做 golden 比對，不一致時以非零狀態結束
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from backend.extract import ENGINES, available_engines
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+# 基準子行程：載入 fixtures 但不解析
+BASELINE = "noop"
+
+
+def load_fixtures():
+    fixtures = []
+    for html_path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(html_path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        with open(html_path[:-len(".html")] + ".json", 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+        fixtures.append((os.path.basename(html_path), html_content, expected))
+    return fixtures
+
+
+def check_golden(engines):
+    failures = 0
+    for name, html_content, expected in load_fixtures():
+        for engine in engines:
+            got = ENGINES[engine](html_content)
+            if got != expected:
+                failures += 1
+                print(f"❌ {engine} / {name}: 預期 {len(expected)} 段，得到 {len(got)} 段")
+                for i, (want, have) in enumerate(zip(expected, got)):
+                    if want != have:
+                        print(f"   第 {i + 1} 段不同:\n   - {want!r}\n   + {have!r}")
+                        break
+    return failures
+
+
+def max_rss_kb():
+    """行程至今的峰值 RSS (KB)；macOS 的 ru_maxrss 單位為 bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def measure(engine, repeat):
+    """在目前行程中量測單一引擎 (由子行程呼叫)；engine 為 BASELINE 時只載入 fixtures"""
+    fixtures = load_fixtures()
+    if engine == BASELINE:
+        return {"engine": engine, "max_rss_kb": max_rss_kb()}
+    extract = ENGINES[engine]
+    extract(fixtures[0][1])  # 暖身：載入模組
+    best = float('inf')
+    tracemalloc.start()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _, html_content, _ in fixtures:
+            extract(html_content)
+        best = min(best, time.perf_counter() - start)
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "engine": engine,
+        "seconds_per_page": best / len(fixtures),
+        "max_rss_kb": max_rss_kb(),
+        "py_peak_kb": py_peak // 1024,
+    }
+
+
+def measure_in_subprocess(engine, repeat):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_extract", "--measure", engine, "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.repeat)))
+        return
+
+    engines = available_engines()
+    print(f"🔧 可用引擎: {', '.join(engines)}")
+    for engine in ENGINES:
+        if engine not in engines:
+            optional = " (選用套件，見 requirements.txt 註解)" if engine == "selectolax" else ""
+            print(f"⏭️ 略過 {engine}: 未安裝{optional}")
+    failures = check_golden(engines)
+    if failures:
+        sys.exit(1)
+    print(f"✅ golden 比對通過 ({len(load_fixtures())} 個檔案)")
+    if args.check:
+        return
+
+    baseline = measure_in_subprocess(BASELINE, args.repeat)["max_rss_kb"]
+    print(f"📏 基準子行程峰值 RSS: {baseline} KB")
+    for engine in engines:
+        result = measure_in_subprocess(engine, args.repeat)
+        print(f"⏱️ {engine:<10} {result['seconds_per_page'] * 1000:8.3f} ms/頁   "
+              f"峰值 RSS +{result['max_rss_kb'] - baseline} KB   Python 配置峰值 {result['py_peak_kb']} KB")
+
+
+if __name__ == "__main__":
+    main()
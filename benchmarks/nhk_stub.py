@@ -0,0 +1,145 @@
+"""
+本機 NHK 端點替身：以 benchmarks/fixtures/html/*.html 提供新聞清單與文章頁面，供離線執行 run_sync。
+
+- /news/json16/new_001.json      與 NHK 清單 API 相同結構 (channel.item[].id / title / link)，支援 ETag
+- /newsweb/na/na-{id}            依文章 ID 輪流回傳 fixtures 中的 HTML
+  (與 NHK 相同：尚未同意的 Context 會先收到只有預覽段落的遮罩頁面，遮罩插在內文之後；
+  點擊確認後寫入 Cookie 並重新載入，之後才回傳完整內文)
+
+把 NHK_LIST_URL / NHK_ARTICLE_URL 指向 StubServer.list_url / article_url 即可 (需在匯入 backend.crawl 前設定)。
+
+用法:
+    python -m benchmarks.nhk_stub --articles 20 --port 8765
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+LIST_PATH = "/news/json16/new_001.json"
+ARTICLE_PREFIX = "/newsweb/na/na-"
+CONSENT_COOKIE = "nhk_consent=1"
+
+# fixtures 內存下來的遮罩 (只用於擷取引擎的 golden 比對)，由替身自己的同意流程取代
+_FIXTURE_DIALOG = re.compile(r'<div[^>]*role="dialog".*?</button></div></div>\s*', re.S)
+_MAIN = re.compile(r'<main>.*</main>', re.S)
+CONSENT_MAIN = (
+    '<main><article class="_1i1d7sh0"><p class="_1i1d7sh2">この記事の続きは確認後にご覧いただけます…</p></article></main>'
+    '<div class="esl7kn0" role="dialog"><div class="esl7kn1"><p>NHKプラスのご利用にあたって</p>'
+    '<button type="button" class="esl7kn2s">確認しました / I understand</button></div></div>'
+    '<script>document.querySelector("[role=dialog] button").addEventListener("click", () => {'
+    f'document.cookie = "{CONSENT_COOKIE}; path=/"; location.reload();'
+    '});</script>'
+)
+
+
+def load_pages():
+    """回傳 [(完整頁面, 遮罩頁面)]，皆為位元組"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            full = _FIXTURE_DIALOG.sub("", f.read())
+        consent = _MAIN.sub(lambda _: CONSENT_MAIN, full)
+        pages.append((full.encode('utf-8'), consent.encode('utf-8')))
+    return pages
+
+
+def make_listing(count):
+    """回傳 (清單 JSON 位元組, 文章 ID 列表)；ID 固定，重複執行時清單內容不變"""
+    ids = [f"k{10015000000 + i:011d}" for i in range(count)]
+    items = [
+        {"id": str(600000 + i), "title": f"ベンチマーク記事 {i + 1}", "link": f"https://www3.nhk.or.jp/news/html/20260101/{aid}.html"}
+        for i, aid in enumerate(ids)
+    ]
+    return json.dumps({"channel": {"item": items}}, ensure_ascii=False).encode('utf-8'), ids
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if self.path == LIST_PATH:
+            if self.headers.get("If-None-Match") == server.etag:
+                self._send(304, b"")
+            else:
+                self._send(200, server.listing, "application/json; charset=utf-8", {"ETag": server.etag})
+        elif self.path.startswith(ARTICLE_PREFIX):
+            aid = self.path[len(ARTICLE_PREFIX):]
+            try:
+                full, consent = server.pages[server.ids.index(aid) % len(server.pages)]
+            except ValueError:
+                self._send(404, b"not found")
+                return
+            consented = CONSENT_COOKIE in self.headers.get("Cookie", "")
+            self._send(200, full if consented else consent, "text/html; charset=utf-8")
+        else:
+            self._send(404, b"not found")
+
+    def _send(self, status, body, content_type="text/plain", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """在背景執行緒提供清單與文章頁面；可當成 context manager 使用"""
+    daemon_threads = True
+
+    def __init__(self, articles=10, port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.pages = load_pages()
+        self.listing, self.ids = make_listing(articles)
+        self.etag = f'"stub-{articles}"'
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def list_url(self):
+        return self.base_url + LIST_PATH
+
+    @property
+    def article_url(self):
+        return self.base_url + ARTICLE_PREFIX + "{id}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--articles', type=int, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    with StubServer(args.articles, args.port) as server:
+        print(f"NHK_LIST_URL={server.list_url}")
+        print(f"NHK_ARTICLE_URL={server.article_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+離線基準測試套件：只使用 benchmarks/fixtures/ 內的資料，不需要連線到 NHK 或 GitHub。
+
+fixtures:
+    html/*.html       存下來的 NHK 文章頁面 (與 bench_extract 共用)
+    news_db.json      舊版 news_db.json 資料庫
+    jlpt_vocab.csv    凍結的 JLPT 字彙表 (JLPTWords.csv 的子集，含原始檔常見的格式雜訊)
+
+每個項目在獨立子行程中執行 (暖身一次後取 repeat 次中最快的一次)，並記錄:
+    seconds             單次執行時間
+    peak_rss_growth_kb  暖身與量測期間的 ru_maxrss 增量 (含 C 層配置)
+    alloc_peak_kb       tracemalloc 量到的單次執行 Python 配置峰值
+
+run_sync 項目會啟動 benchmarks/nhk_stub.py 的本機 HTTP 伺服器代替 NHK 清單與文章端點，
+在暫存目錄中以 Chromium 完整跑一次同步 (需已執行 playwright install chromium)。
+缺少選用套件的項目會標示為 skipped，不影響其他項目。
+
+用法:
+    python -m benchmarks.suite                                   # 全部執行，結果寫入 benchmarks/results/latest.json
+    python -m benchmarks.suite --only tokenize analyze --repeat 5
+    python -m benchmarks.suite --out base.json                   # 建立比較基準
+    python -m benchmarks.suite --compare base.json               # 執行後與基準比較，退步超過門檻時以非零狀態結束
+    python -m benchmarks.suite --compare base.json --against new.json --threshold 0.2
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+HTML_DIR = os.path.join(FIXTURE_DIR, "html")
+NEWS_DB_FIXTURE = os.path.join(FIXTURE_DIR, "news_db.json")
+VOCAB_FIXTURE = os.path.join(FIXTURE_DIR, "jlpt_vocab.csv")
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "latest.json")
+
+# 比較時忽略的絕對差距 (避免極短項目的計時雜訊與小額配置被當成退步)
+MIN_SECONDS_DELTA = 0.002
+MIN_KB_DELTA = 256
+METRICS = ("seconds", "peak_rss_growth_kb", "alloc_peak_kb")
+
+
+def load_texts():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(HTML_DIR, "*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append("".join(json.load(f)))
+    return texts
+
+
+def load_pages():
+    pages = []
+    for path in sorted(glob.glob(os.path.join(HTML_DIR, "*.html"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+    return pages
+
+
+# --- 各項目：setup 在計時外執行，回傳 (要計時的函式, 每次處理的項目數) ---
+
+def bench_tokenize(workdir):
+    from app.analyzer import get_tokenizer, tokenize_lemmas
+    texts = load_texts()
+    get_tokenizer()  # 字典載入屬於冷啟動，不計入
+    return lambda: [tokenize_lemmas(text) for text in texts], len(texts)
+
+
+def bench_analyze(workdir):
+    from app.analyzer import analyze_jlpt_level, get_tokenizer
+    from app.vocab import load_vocab_df
+    vocab_df = load_vocab_df(VOCAB_FIXTURE)
+    texts = load_texts()
+    get_tokenizer()
+    return lambda: [analyze_jlpt_level(text, vocab_df) for text in texts], len(texts)
+
+
+def bench_extract(workdir):
+    from backend.extract import extract_article_paragraphs
+    pages = load_pages()
+    return lambda: [extract_article_paragraphs(page) for page in pages], len(pages)
+
+
+def bench_vocab_load(workdir):
+    from app.analyzer import VocabIndex
+    from app.vocab import load_vocab_df
+
+    def run():
+        return VocabIndex.from_dataframe(load_vocab_df(VOCAB_FIXTURE))
+    return run, 1
+
+
+def bench_vocab_snapshot(workdir):
+    from app.vocab import build_snapshot, read_snapshot
+    path = os.path.join(workdir, "jlpt_vocab.bin")
+    build_snapshot(VOCAB_FIXTURE, path)
+    return lambda: read_snapshot(path), 1
+
+
+def bench_db_json(workdir):
+    """舊版 news_db.json 的整檔讀取與重寫"""
+    path = os.path.join(workdir, "news_db.json")
+    with open(NEWS_DB_FIXTURE, 'r', encoding='utf-8') as f:
+        count = len(json.load(f))
+
+    def run():
+        with open(NEWS_DB_FIXTURE, 'r', encoding='utf-8') as f:
+            db = json.load(f)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(db, f, ensure_ascii=False, indent=4)
+    return run, count
+
+
+def bench_db_store(workdir):
+    """SQLite 文章資料庫：匯入 news_db.json、列出全部文章後關閉"""
+    from backend.store import ArticleStore
+    path = os.path.join(workdir, "news.db")
+
+    def run():
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        store = ArticleStore(path)
+        store.import_json(NEWS_DB_FIXTURE)
+        store.list_articles()
+        store.close()
+    with open(NEWS_DB_FIXTURE, 'r', encoding='utf-8') as f:
+        return run, len(json.load(f))
+
+
+def bench_run_sync(workdir, articles=8):
+    from benchmarks.nhk_stub import StubServer
+    server = StubServer(articles).__enter__()
+    # backend.crawl 在匯入時讀取端點設定，必須先設定環境變數
+    os.environ["NHK_LIST_URL"] = server.list_url
+    os.environ["NHK_ARTICLE_URL"] = server.article_url
+    os.chdir(workdir)
+
+    from app.vocab import SNAPSHOT_PATH, build_snapshot
+    from backend.crawl import LIST_STATE_PATH
+    from backend.store import RetentionPolicy
+    import sync_news
+
+    build_snapshot(VOCAB_FIXTURE, SNAPSHOT_PATH)
+
+    def run():
+        for path in (sync_news.DB_PATH, f"{sync_news.DB_PATH}-wal", f"{sync_news.DB_PATH}-shm", LIST_STATE_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+        sync_news.run_sync(concurrency=4, min_interval=0.0, retention=RetentionPolicy())
+    return run, articles
+
+
+BENCHMARKS = {
+    "tokenize": bench_tokenize,
+    "analyze": bench_analyze,
+    "extract": bench_extract,
+    "vocab_load": bench_vocab_load,
+    "vocab_snapshot": bench_vocab_snapshot,
+    "db_json": bench_db_json,
+    "db_store": bench_db_store,
+    "run_sync": bench_run_sync,
+}
+# 單次執行較久的項目使用較少的重複次數
+MAX_REPEAT = {"run_sync": 3}
+
+
+def measure(name, repeat):
+    """在目前行程中量測單一項目 (由子行程呼叫)；run_sync 等項目的輸出導向 stderr"""
+    os.environ.pop("NHK_ANALYZER_SOCKET", None)  # 一律量測行程內分析
+    workdir = tempfile.mkdtemp(prefix=f"nhk-bench-{name}-")
+    try:
+        with redirect_stdout(sys.stderr):
+            try:
+                fn, items = BENCHMARKS[name](workdir)
+                rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                fn()  # 暖身 (延遲匯入的選用套件也在這裡觸發)
+            except ImportError as e:
+                return {"name": name, "skipped": f"{type(e).__name__}: {e}"}
+            repeat = min(repeat, MAX_REPEAT.get(name, repeat))
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+            tracemalloc.start()
+            fn()
+            alloc_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if sys.platform == "darwin":
+        peak_rss_kb //= 1024  # macOS 的 ru_maxrss 單位為 bytes
+    return {
+        "name": name,
+        "items": items,
+        "repeat": repeat,
+        "seconds": best,
+        "ms_per_item": best / items * 1000 if items else None,
+        "peak_rss_growth_kb": peak_rss_kb,
+        "alloc_peak_kb": alloc_peak // 1024,
+    }
+
+
+def run_in_subprocess(name, repeat):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--measure", name, "--repeat", str(repeat)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        tail = (proc.stderr.strip().splitlines() or ["(無輸出)"])[-1]
+        return {"name": name, "error": f"子行程結束狀態 {proc.returncode}: {tail}"}
+    return json.loads(lines[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names, repeat):
+    results = {}
+    for name in names:
+        result = run_in_subprocess(name, repeat)
+        results[name] = result
+        if "seconds" in result:
+            print(f"⏱️ {name:<15} {result['seconds'] * 1000:10.2f} ms  ({result['items']} 項)   "
+                  f"峰值 RSS +{result['peak_rss_growth_kb']} KB   配置峰值 {result['alloc_peak_kb']} KB")
+        else:
+            print(f"⏭️ {name:<15} {result.get('skipped') or result.get('error')}")
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """回傳退步項目列表 [(項目, 指標, 基準值, 目前值)]，同時印出兩份結果的比較表"""
+    regressions = []
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if not now or "seconds" not in base or "seconds" not in now:
+            continue
+        cells = []
+        for metric in METRICS:
+            old, new = base[metric], now[metric]
+            floor = MIN_SECONDS_DELTA if metric == "seconds" else MIN_KB_DELTA
+            ratio = new / old if old else float('inf') if new else 1.0
+            flagged = new - old > floor and ratio > 1 + threshold
+            if flagged:
+                regressions.append((name, metric, old, new))
+            cells.append(f"{metric} {ratio:6.2f}x{' ❗' if flagged else ''}")
+        print(f"{'🔴' if any(r[0] == name for r in regressions) else '🟢'} {name:<15} " + "   ".join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="只執行指定項目")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--out', default=RESULTS_PATH, help="結果 JSON 輸出路徑")
+    parser.add_argument('--compare', metavar='BASELINE', help="與基準結果 JSON 比較")
+    parser.add_argument('--against', metavar='RESULTS', help="與 --compare 比較的既有結果 (未指定時先執行一次)")
+    parser.add_argument('--threshold', type=float, default=0.10, help="超過基準多少比例視為退步 (預設 0.10)")
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.repeat)))
+        return
+
+    if args.against:
+        with open(args.against, 'r', encoding='utf-8') as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args.only or list(BENCHMARKS), args.repeat)
+        if os.path.dirname(args.out):
+            os.makedirs(os.path.dirname(args.out), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果已寫入 {args.out}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"📊 與基準比較 ({baseline.get('commit')} → {current.get('commit')}，門檻 +{args.threshold:.0%})")
+        regressions = compare(baseline, current, args.threshold)
+        for name, metric, old, new in regressions:
+            print(f"❌ {name} {metric}: {old:.4g} → {new:.4g}")
+        if regressions:
+            sys.exit(1)
+        print("✅ 沒有超過門檻的退步")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,241 @@
-import json
+import argparse
+import cProfile
 import os
 import time
-from backend.crawl import fetch_nhk_news, fetch_article_full_text, setup_browser_context
+from contextlib import nullcontext
+from backend.async_crawl import HostRateLimiter, fetch_articles_concurrently
+from backend.crawl import ConsentState, enable_lean_mode, fetch_nhk_news, fetch_article_full_text, setup_browser_context
+from backend.metrics import NullTrace, SyncMetrics
+from backend.store import RetentionPolicy, analysis_stamp, open_store
+from app.analyzer import TOKENIZER_STAMP, build_analysis, refresh_analysis, version_match_stamp
+from app.batch import WRITE_BATCH, analyze_corpus, write_results
+from app.vocab import load_vocab_index, read_snapshot_version
 from playwright.sync_api import sync_playwright
 
-# 根據環境決定資料庫路徑
+# 根據環境決定資料庫路徑 (LEGACY_JSON_PATH 為舊版 JSON 資料庫，首次執行時自動匯入)
 if os.getenv("GITHUB_ACTIONS"):
-    DB_PATH = "data/news_db.json"
+    DB_PATH = "data/news.db"
+    LEGACY_JSON_PATH = "data/news_db.json"
 else:
-    DB_PATH = "data/news_db_test.json"
+    DB_PATH = "data/news_test.db"
+    LEGACY_JSON_PATH = "data/news_db_test.json"
 
-def run_sync():
-    print(f"📡 [{time.strftime('%H:%M:%S')}] 開始同步 NHK 新聞...")
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+# 同步計時輸出 (JSON lines 執行記錄、Prometheus 摘要、--profile 的 cProfile 結果)
+RUN_LOG_PATH = "data/metrics/sync_run.jsonl"
+PROM_PATH = "data/metrics/sync.prom"
+PROFILE_PATH = "data/metrics/sync.pstats"
 
-    # 1. 抓取最新清單
-    df_list = fetch_nhk_news()
-    if df_list.empty:
-        print("❌ 無法取得新聞清單。")
-        return
+def make_article_record(row, content, vocab_index):
+    """組出寫入資料庫的單篇文章資料 (含同步時計算的 JLPT 分析)"""
+    record = {
+        "title": row['title'],
+        "url": row['url'],
+        "content": content,
+        "timestamp": time.time()
+    }
+    if vocab_index is not None:
+        record["analysis"] = build_analysis("".join(content), vocab_index)
+    return record
 
-    # 2. 讀取現有資料
-    db = {}
-    if os.path.exists(DB_PATH):
-        try:
-            with open(DB_PATH, 'r', encoding='utf-8') as f:
-                db = json.load(f)
-        except:
-            db = {}
+def _span(metrics, stage):
+    return metrics.span(stage) if metrics else nullcontext({})
 
-    # 3. 啟動全域瀏覽器 Context (共用模式)
-    new_count = 0
+def fetch_sequential(pending_rows, lean=True, metrics=None, min_interval=1.0):
+    """單一 Page 逐篇抓取 (原本的共用 Context 模式)，回傳 {aid: 段落列表}；請求間隔由 HostRateLimiter 控制"""
+    results = {}
+    limiter = HostRateLimiter(min_interval)
     with sync_playwright() as p:
-        browser, context = setup_browser_context(p)
+        with _span(metrics, "browser_launch"):
+            browser, context = setup_browser_context(p)
         page = context.new_page()
-        
+        traffic = enable_lean_mode(page) if lean else None
+        # 第一篇遇到遮罩時穿透並記錄同意狀態，之後的文章直接走快速路徑
+        consent = ConsentState()
+
         try:
-            # 4. 增量爬取新文章
-            for _, row in df_list.iterrows():
-                aid = str(row['id'])
-                if aid not in db:
-                    print(f"🔍 爬取新新聞: {row['title']}")
-                    # ✅ 傳入共用的 page 物件，避免重複啟動瀏覽器
-                    content = fetch_article_full_text(row['url'], page=page)
-                    if content:
-                        db[aid] = {
-                            "title": row['title'],
-                            "url": row['url'],
-                            "content": content,
-                            "timestamp": time.time()
-                        }
-                        new_count += 1
-                        time.sleep(1) # 友善爬蟲延遲
+            for aid, row in pending_rows:
+                print(f"🔍 爬取新新聞: {row['title']}")
+                trace = metrics.article(aid, row['url']) if metrics else NullTrace()
+                limiter.wait_sync(row['url'])  # 友善爬蟲延遲 (與並行模式相同的 per-host 間隔)
+                # ✅ 傳入共用的 page 物件，避免重複啟動瀏覽器
+                results[aid] = fetch_article_full_text(row['url'], page=page, traffic=traffic, trace=trace, consent=consent)
+                trace.finish(results[aid])
+            consent.log_summary()
+            if traffic:
+                print(f"📦 精簡模式合計: 下載 {traffic.bytes / 1024:.0f} KB，擋下 {traffic.blocked_requests} 個請求 (未下載)")
         finally:
             # ✅ 同步結束前存下最新狀態
-            print(f"⏳ 正在儲存 Playwright 狀態檔...")
-            context.storage_state(path="data/playwright_state.json")
+            print("⏳ 正在儲存 Playwright 狀態檔...")
+            consent.save(context.storage_state())
             browser.close()
+    return results
+
+def _iter_texts(store, ids):
+    """逐篇讀取文章全文 (id, text)，供 app.batch 串流分析"""
+    for aid in ids:
+        record = store.get(aid)
+        if record:
+            yield aid, "".join(record["content"])
+
+def refresh_stale(store, stamp, vocab_index, metrics=None):
+    """
+    串流更新分析戳記過期的文章，回傳更新篇數；記憶體只與 WRITE_BATCH 有關，與過期文章數無關。
+    斷詞設定相同 (只有字彙版本或比對策略改變) 的文章以儲存的 lemmas 重新比對，每 WRITE_BATCH 篇寫入一次；
+    需要重新斷詞的文章交給 app.batch 以多行程分析並分批寫回。
+    """
+    store.set_vocab(vocab_index)
+    retokenize, pending, updated = [], {}, 0
+
+    def flush():
+        with _span(metrics, "db_write") as span:
+            store.upsert_many(pending)
+            span["articles"] = len(pending)
+
+    for aid, record in store.iter_stale(stamp):
+        analysis = record.get("analysis")
+        if not isinstance(analysis, dict) or analysis.get("tokenizer") != TOKENIZER_STAMP:
+            retokenize.append(aid)
+            continue
+        pending[aid] = {**record, "analysis": refresh_analysis(analysis, "".join(record["content"]), vocab_index)}
+        if len(pending) >= WRITE_BATCH:
+            flush()
+            updated += len(pending)
+            pending = {}
+    if pending:
+        flush()
+        updated += len(pending)
+
+    if retokenize:
+        processes = min(os.cpu_count() or 1, len(retokenize))
+        with _span(metrics, "analysis") as span:
+            results = analyze_corpus(_iter_texts(store, retokenize), vocab_index, processes, with_lemmas=True)
+            for _ in write_results(store, results, vocab_index):
+                updated += 1
+            span["articles"] = len(retokenize)
+    return updated
+
+def load_sync_vocab(refresh=False):
+    """載入 JLPT 字彙索引 (本機快照優先)；失敗時回傳 None，本次不產生分析結果"""
+    try:
+        return load_vocab_index(refresh=refresh)
+    except Exception as e:
+        print(f"⚠️ 字彙表載入失敗，本次不產生分析結果: {e}")
+        return None
 
-    # 5. 自動覆蓋：按時間排序並保留最新 15 則
-    sorted_items = sorted(db.items(), key=lambda x: x[1]['timestamp'], reverse=True)[:15]
-    final_db = dict(sorted_items)
+def run_sync(concurrency=1, min_interval=1.0, article_timeout=60.0, lean=True, retention=None, refresh_vocab=False,
+             metrics=None):
+    """
+    concurrency > 1 時改用 async Playwright 以多個 Page 並行抓取；
+    兩種模式都由 per-host 限速器 (min_interval 秒) 取代逐篇 sleep。
+    lean=True 時擋下內文擷取用不到的子資源，並記錄每篇的流量與耗時。
+    retention 為 RetentionPolicy，預設讀取 NHK_MAX_ARTICLES / NHK_MAX_AGE_DAYS (預設保留 15 則)。
+    refresh_vocab=True 時重新下載字彙表並更新本機快照。
+    metrics 為 SyncMetrics 時記錄各階段耗時 (由呼叫端負責輸出)。
+    """
+    print(f"📡 [{time.strftime('%H:%M:%S')}] 開始同步 NHK 新聞...")
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+    # 1. 抓取最新清單
+    with _span(metrics, "list_fetch") as span:
+        df_list = fetch_nhk_news()
+        span["articles"] = len(df_list)
+    if df_list.empty:
+        print("❌ 無法取得新聞清單。")
+        return
 
-    # 6. 寫回資料庫
-    with open(DB_PATH, 'w', encoding='utf-8') as f:
-        json.dump(final_db, f, ensure_ascii=False, indent=4)
+    # 2. 開啟資料庫 (只查詢清單中的 ID 是否已存在，不載入整個資料庫)
+    store = open_store(DB_PATH, legacy_json=LEGACY_JSON_PATH)
+    known_ids = store.existing_ids(df_list['id'])
 
-    print(f"✅ 同步完成！新增 {new_count} 則，目前共 {len(final_db)} 則儲存於資料庫。")
+    # 3. 增量爬取新文章：先算出新文章 ID，有需要才啟動瀏覽器
+    pending_rows = [(str(row['id']), row) for _, row in df_list.iterrows() if str(row['id']) not in known_ids]
+
+    # 3.5 有新文章 (或要求更新) 時才載入 JLPT 字彙表 (本機快照優先)，於同步階段就完成斷詞與級別統計
+    vocab_loaded = bool(pending_rows or refresh_vocab)
+    vocab_index = load_sync_vocab(refresh_vocab) if vocab_loaded else None
+    if vocab_index is not None:
+        store.set_vocab(vocab_index)
+    if not pending_rows:
+        print("📭 沒有新文章，略過瀏覽器啟動。")
+        contents = {}
+    elif concurrency > 1:
+        contents = fetch_articles_concurrently(
+            [(aid, row['url']) for aid, row in pending_rows],
+            concurrency=concurrency, min_interval=min_interval, timeout=article_timeout, lean=lean, metrics=metrics
+        )
+    else:
+        contents = fetch_sequential(pending_rows, lean=lean, metrics=metrics, min_interval=min_interval)
+
+    # 4. 依清單順序寫入新文章 (單一交易)
+    new_records = {}
+    for aid, row in pending_rows:
+        content = contents.get(aid)
+        if content:
+            with metrics.span("analysis", article=aid) if metrics else nullcontext():
+                new_records[aid] = make_article_record(row, content, vocab_index)
+    with _span(metrics, "db_write") as span:
+        store.upsert_many(new_records)
+        span["articles"] = len(new_records)
+
+    # 5. 既有文章若分析戳記過期 (字彙表或斷詞設定變更) 則一併更新
+    #    未載入字彙表時只讀快照標頭的版本判斷，確實有過期文章才載入完整字彙表
+    if not vocab_loaded and read_snapshot_version() is None:
+        # 尚無快照：建立一次 (之後的同步就只需讀標頭)
+        vocab_loaded, vocab_index = True, load_sync_vocab()
+    if vocab_loaded:
+        version = vocab_index.version if vocab_index is not None else None
+    else:
+        version = read_snapshot_version()
+    if version is not None:
+        stamp = analysis_stamp({"tokenizer": TOKENIZER_STAMP, "vocab": version_match_stamp(version)})
+        has_stale = store.has_stale(stamp)
+        if has_stale and not vocab_loaded:
+            vocab_loaded, vocab_index = True, load_sync_vocab()
+        if has_stale and vocab_index is not None:
+            print(f"♻️ 已更新 {refresh_stale(store, stamp, vocab_index, metrics)} 則過期的分析結果")
+
+    # 6. 依保留規則淘汰舊文章
+    evicted = store.apply_retention(retention or RetentionPolicy.from_env())
+    total = store.count()
+    store.close()
+
+    print(f"✅ 同步完成！新增 {len(new_records)} 則，淘汰 {len(evicted)} 則，目前共 {total} 則儲存於資料庫。")
 
 if __name__ == "__main__":
-    run_sync()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="同步 NHK 新聞至資料庫")
+    parser.add_argument('--concurrency', type=int, default=1, help="同時抓取的 Page 數 (>1 啟用並行模式)")
+    parser.add_argument('--min-interval', type=float, default=1.0, help="同一 host 請求最小間隔秒數")
+    parser.add_argument('--timeout', type=float, default=60.0, help="單篇文章逾時秒數")
+    parser.add_argument('--no-lean', dest='lean', action='store_false', help="不擋子資源 (載入完整頁面)")
+    parser.add_argument('--keep', type=int, default=None, help="最多保留幾則文章 (預設 NHK_MAX_ARTICLES 或 15)")
+    parser.add_argument('--max-age-days', type=float, default=None, help="淘汰超過幾天的文章")
+    parser.add_argument('--refresh-vocab', action='store_true', help="重新下載 JLPT 字彙表並更新本機快照")
+    parser.add_argument('--run-log', default=RUN_LOG_PATH, help="各階段計時的 JSON lines 執行記錄")
+    parser.add_argument('--prom', default=PROM_PATH, help="Prometheus text format 指標摘要")
+    parser.add_argument('--profile', nargs='?', const=PROFILE_PATH, default=None,
+                        help=f"同時以 cProfile 記錄整次同步 (預設輸出 {PROFILE_PATH})")
+    args = parser.parse_args()
+
+    retention = RetentionPolicy.from_env()
+    if args.keep is not None:
+        retention.max_articles = args.keep or None
+    if args.max_age_days is not None:
+        retention.max_age_days = args.max_age_days
+
+    metrics = SyncMetrics()
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler:
+            profiler.enable()
+        run_sync(concurrency=args.concurrency, min_interval=args.min_interval, article_timeout=args.timeout,
+                 lean=args.lean, retention=retention, refresh_vocab=args.refresh_vocab, metrics=metrics)
+    finally:
+        if profiler:
+            profiler.disable()
+            os.makedirs(os.path.dirname(args.profile) or ".", exist_ok=True)
+            profiler.dump_stats(args.profile)
+            print(f"🧪 cProfile 結果已寫入 {args.profile}")
+        metrics.write_jsonl(args.run_log)
+        metrics.write_prometheus(args.prom)
+        summary = metrics.summary()
+        print(f"⏱️ 計時記錄已寫入 {args.run_log} / {args.prom} (總耗時 {summary['duration_s']:.1f}s)")
\ No newline at end of file
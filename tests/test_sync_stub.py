@@ -0,0 +1,75 @@
+"""
+以 benchmarks/nhk_stub.py 的本機端點完整執行 sync_news.py，確認寫入資料庫的段落與 fixtures 的 golden 檔完全相同。
+
+替身與 NHK 相同：尚未同意的 Context 會先收到只有預覽段落 (以「…」結尾) 的遮罩頁面，
+所以預覽文字被當成內文存入、或遮罩未穿透時，比對都會失敗。
+需要 Playwright 的 Chromium (playwright install chromium)。
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("pandas")
+pytest.importorskip("sudachipy")
+sync_api = pytest.importorskip("playwright.sync_api")
+
+from benchmarks.nhk_stub import FIXTURE_DIR, StubServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOCAB_FIXTURE = os.path.join(ROOT, "benchmarks", "fixtures", "jlpt_vocab.csv")
+
+
+def chromium_installed():
+    with sync_api.sync_playwright() as p:
+        return os.path.exists(p.chromium.executable_path)
+
+
+def expected_paragraphs():
+    expected = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            expected.append(json.load(f))
+    return expected
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_sync_stores_fixture_text(tmp_path, concurrency):
+    if not chromium_installed():
+        pytest.skip("尚未執行 playwright install chromium")
+    from app.vocab import SNAPSHOT_PATH, build_snapshot
+    from backend.store import ArticleStore
+
+    articles = 7
+    os.makedirs(tmp_path / "data")
+    build_snapshot(VOCAB_FIXTURE, str(tmp_path / SNAPSHOT_PATH))
+    with StubServer(articles) as server:
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+            "NHK_LIST_URL": server.list_url,
+            "NHK_ARTICLE_URL": server.article_url,
+            "NHK_MAX_ARTICLES": str(articles),
+        }
+        env.pop("GITHUB_ACTIONS", None)
+        env.pop("NHK_ANALYZER_SOCKET", None)
+        proc = subprocess.run(
+            [sys.executable, os.path.join(ROOT, "sync_news.py"),
+             "--concurrency", str(concurrency), "--min-interval", "0", "--timeout", "30"],
+            cwd=tmp_path, env=env, capture_output=True, text=True, timeout=300,
+        )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+
+    expected = expected_paragraphs()
+    store = ArticleStore(str(tmp_path / "data" / "news_test.db"))
+    try:
+        assert store.count() == articles
+        for i in range(articles):
+            record = store.get(str(600000 + i))
+            assert record is not None, f"文章 {i} 未寫入"
+            assert record["content"] == expected[i % len(expected)], f"文章 {i} 的段落與 fixture 不同"
+    finally:
+        store.close()
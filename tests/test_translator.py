@@ -0,0 +1,68 @@
+"""
+翻譯服務的離線測試：以 FakeBackend 取代 googletrans，不需連網。
+
+執行: python -m pytest tests
+"""
+import pytest
+
+pytest.importorskip("streamlit")
+
+from app.translator import FakeBackend, TranslationCache, TranslationService, cache_key
+
+
+def make_service(max_bytes=1024 * 1024):
+    backend = FakeBackend()
+    return backend, TranslationService(backend, TranslationCache(":memory:", max_bytes=max_bytes))
+
+
+def test_repeated_sentence_translated_once():
+    backend, service = make_service()
+    results = service.translate_many(["今日は晴れ。", "明日は雨。", "今日は晴れ。"], dest="zh-tw")
+    assert results == ["[zh-tw] 今日は晴れ。", "[zh-tw] 明日は雨。", "[zh-tw] 今日は晴れ。"]
+    assert backend.calls == 2
+
+
+def test_second_call_served_from_cache():
+    backend, service = make_service()
+    first = service.translate_many(["今日は晴れ。", "明日は雨。"])
+    second = service.translate_many(["明日は雨。", "今日は晴れ。"])
+    assert second == first[::-1]
+    assert backend.calls == 2
+
+    # 不同目標語言是不同的快取鍵
+    service.translate("今日は晴れ。", dest="en")
+    assert backend.calls == 3
+
+
+def test_eviction_respects_max_bytes():
+    cache = TranslationCache(":memory:", max_bytes=40)
+    cache.put_many({"a": "x" * 15, "b": "y" * 15})
+    cache.get_many(["a"])  # a 較近使用，b 先被淘汰
+    cache.put_many({"c": "z" * 15})
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    assert cache._size <= cache.max_bytes
+
+
+def test_oversized_entry_is_not_cached_and_evicts_nothing():
+    cache = TranslationCache(":memory:", max_bytes=50)
+    cache.put_many({"small": "s" * 10})
+    cache.put_many({"huge": "h" * 200})
+    assert cache.get_many(["small", "huge"]) == {"small": "s" * 10}
+    assert cache._size == 10
+
+
+def test_current_batch_is_never_evicted():
+    cache = TranslationCache(":memory:", max_bytes=30)
+    cache.put_many({"old": "o" * 20})
+    cache.put_many({"new1": "n" * 10, "new2": "m" * 10, "new3": "k" * 20})
+    # 本批依序寫入放得下的部分 (new1, new2)，只淘汰較舊的項目
+    assert set(cache.get_many(["old", "new1", "new2", "new3"])) == {"new1", "new2"}
+    assert cache._size == 20
+
+
+def test_service_keys_match_cache():
+    backend, service = make_service()
+    service.translate("今日は晴れ。")
+    assert service.cache.get_many([cache_key("今日は晴れ。", "zh-tw")]) == {
+        cache_key("今日は晴れ。", "zh-tw"): "[zh-tw] 今日は晴れ。"
+    }